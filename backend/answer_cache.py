@@ -0,0 +1,130 @@
+import os
+from typing import List, Optional, Tuple
+
+# --- Semantic Answer Cache ---
+# Answers to context-free questions ("what are the hostel timings?") are stored
+# in Postgres next to the question embedding, so every worker shares them.
+# A new question is served from the cache when its embedding is close enough
+# to a stored one, the entry is younger than the TTL, and no document was
+# ingested or deleted since the answer was generated.
+ANSWER_CACHE_ENABLED = os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+ANSWER_CACHE_MIN_SIMILARITY = float(os.getenv("ANSWER_CACHE_MIN_SIMILARITY", "0.92"))
+ANSWER_CACHE_TTL_SECONDS = int(os.getenv("ANSWER_CACHE_TTL_SECONDS", str(24 * 3600)))
+ANSWER_CACHE_MAX_ENTRIES = int(os.getenv("ANSWER_CACHE_MAX_ENTRIES", "5000"))
+
+
+def to_pgvector(vector: List[float]) -> str:
+    """Formats an embedding as a pgvector literal ('[0.1,0.2,...]')."""
+    return "[" + ",".join(repr(float(x)) for x in vector) + "]"
+
+
+# --- Async API (used by /bot/ask) ---
+async def lookup_answer(conn, question_vector: List[float]) -> Tuple[Optional[str], int]:
+    """
+    Returns (answer, generation). answer is the closest fresh cached answer above
+    the similarity threshold, or None on a miss. The generation must be passed
+    back to store_answer() so stale answers are never written.
+    """
+    vector = to_pgvector(question_vector)
+    cur = await conn.execute("SELECT generation FROM answer_cache_stats")
+    generation = (await cur.fetchone())["generation"]
+
+    cur = await conn.execute(
+        """
+        SELECT id, answer, llm_seconds, 1 - (embedding <=> %s::vector) AS similarity
+        FROM answer_cache
+        WHERE created_at > NOW() - make_interval(secs => %s)
+        ORDER BY embedding <=> %s::vector
+        LIMIT 1
+        """,
+        (vector, ANSWER_CACHE_TTL_SECONDS, vector)
+    )
+    row = await cur.fetchone()
+
+    if row and row["similarity"] >= ANSWER_CACHE_MIN_SIMILARITY:
+        await conn.execute(
+            "UPDATE answer_cache SET hit_count = hit_count + 1, last_hit_at = NOW() WHERE id = %s",
+            (row["id"],)
+        )
+        await conn.execute(
+            """
+            UPDATE answer_cache_stats
+            SET lookups = lookups + 1, hits = hits + 1, saved_llm_seconds = saved_llm_seconds + %s
+            """,
+            (row["llm_seconds"],)
+        )
+        await conn.commit()
+        return row["answer"], generation
+
+    await conn.execute("UPDATE answer_cache_stats SET lookups = lookups + 1")
+    await conn.commit()
+    return None, generation
+
+
+async def store_answer(conn, question: str, question_vector: List[float], answer: str,
+                       llm_seconds: float, generation: int):
+    """
+    Caches a freshly generated answer. The insert is skipped if the document
+    collection changed (generation bumped) while the answer was being generated.
+    Expired entries are purged and the table is trimmed to ANSWER_CACHE_MAX_ENTRIES,
+    least recently used first.
+    """
+    await conn.execute(
+        """
+        INSERT INTO answer_cache (question, embedding, answer, llm_seconds)
+        SELECT %s, %s::vector, %s, %s
+        WHERE (SELECT generation FROM answer_cache_stats) = %s
+        """,
+        (question, to_pgvector(question_vector), answer, llm_seconds, generation)
+    )
+    await conn.execute(
+        "DELETE FROM answer_cache WHERE created_at <= NOW() - make_interval(secs => %s)",
+        (ANSWER_CACHE_TTL_SECONDS,)
+    )
+    await conn.execute(
+        """
+        DELETE FROM answer_cache WHERE id IN (
+            SELECT id FROM answer_cache ORDER BY last_hit_at DESC OFFSET %s
+        )
+        """,
+        (ANSWER_CACHE_MAX_ENTRIES,)
+    )
+    await conn.commit()
+
+
+async def get_cache_stats(conn) -> dict:
+    cur = await conn.execute(
+        """
+        SELECT s.lookups, s.hits, s.saved_llm_seconds, s.invalidations,
+               (SELECT COUNT(*) FROM answer_cache) AS entries
+        FROM answer_cache_stats s
+        """
+    )
+    row = await cur.fetchone()
+    lookups = row["lookups"]
+    return {
+        "enabled": ANSWER_CACHE_ENABLED,
+        "entries": row["entries"],
+        "lookups": lookups,
+        "hits": row["hits"],
+        "hit_rate": round(row["hits"] / lookups, 4) if lookups else 0.0,
+        "saved_llm_seconds": round(row["saved_llm_seconds"], 2),
+        "invalidations": row["invalidations"],
+        "min_similarity": ANSWER_CACHE_MIN_SIMILARITY,
+        "ttl_seconds": ANSWER_CACHE_TTL_SECONDS,
+        "max_entries": ANSWER_CACHE_MAX_ENTRIES,
+    }
+
+
+# --- Sync API (used by ingest.py) ---
+def invalidate_answer_cache(conn):
+    """
+    Drops every cached answer. Call this whenever the New_embeddings collection
+    changes. `conn` is any DB-API connection (ingest.py uses psycopg2).
+    """
+    with conn.cursor() as curs:
+        curs.execute("DELETE FROM answer_cache")
+        curs.execute(
+            "UPDATE answer_cache_stats SET generation = generation + 1, invalidations = invalidations + 1"
+        )
+    conn.commit()
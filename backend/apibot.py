@@ -1,27 +1,38 @@
 import os
-import psycopg2
+import re
+import json
+import time
 import uuid
-from psycopg2.extras import RealDictCursor
 from fastapi import APIRouter, HTTPException, Depends
-from pydantic import BaseModel, Field
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
 from langchain_core.prompts import ChatPromptTemplate, MessagesPlaceholder
-from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
-from langchain_core.runnables import RunnableParallel, RunnableLambda
+from langchain_core.output_parsers import StrOutputParser
+from langchain_core.runnables import RunnableLambda, RunnablePassthrough, RunnableBranch
 from langchain_core.runnables.history import RunnableWithMessageHistory
-from langchain_community.chat_message_histories import PostgresChatMessageHistory
 from langchain_ollama import OllamaLLM
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_postgres import PGVector
-from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage, AIMessage
 from dotenv import load_dotenv
 from typing import Optional
-from auth_routes import get_current_user_id
+from auth_routes import get_current_user_id, get_current_admin_user
+from chat_history import AsyncPostgresChatMessageHistory, load_summary, save_summary
+from answer_cache import ANSWER_CACHE_ENABLED, lookup_answer, store_answer, get_cache_stats
+from preference_jobs import enqueue_preference_job
+from embedding_cache import get_shared_embeddings
+from db import async_connection, pool_stats
+from llm_scheduler import ScheduledLLM, llm_scheduler, PRIORITY_INTERACTIVE, PRIORITY_SUMMARY
+from preference_index import preference_index
+from hybrid_search import hybrid_search
+from context_packer import pack_prompt_parts, count_tokens
+from reranker import RERANK_ENABLED, RERANK_CANDIDATES, get_reranker
+from registry import COLLECTION_NAME_DOCS, process_stats
+from structured_answers import answer_structured, structured_stats
 
 # --- Load Environment ---
 load_dotenv()
 
 # --- DB CONFIG (FIXED) ---
-# Standard string for psycopg2 and PostgresChatMessageHistory
+# Standard string for psycopg (async) and the chat history table
 DB_CONNECTION_STRING = os.getenv("DB_URL_STANDARD") 
 # SQLAlchemy string for PGVector
 DB_URL_SQLALCHEMY = os.getenv("DB_URL_SQLALCHEMY")
@@ -32,44 +43,51 @@ if not DB_CONNECTION_STRING or not DB_URL_SQLALCHEMY:
 
 # --- LangChain Setup ---
 llm = OllamaLLM(model="llama3.1")
-embeddings = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-
-# --- PGVector: RAG Docs (FIXED) ---
-COLLECTION_NAME_DOCS = "New_embeddings"
-doc_store = PGVector(
-    connection=DB_URL_SQLALCHEMY,  # <-- Uses correct string
-    collection_name=COLLECTION_NAME_DOCS, 
-    embeddings=embeddings
-)
-doc_retriever = doc_store.as_retriever(search_type="similarity", search_kwargs={"k": 3})
-
-# --- PGVector: User Preferences (FIXED) ---
-COLLECTION_NAME_PREFS = "user_preferences"
-preference_store = PGVector(
-    connection=DB_URL_SQLALCHEMY, # <-- Uses correct string
-    collection_name=COLLECTION_NAME_PREFS, 
-    embeddings=embeddings
-)
-preference_retriever = preference_store.as_retriever(search_type="similarity", search_kwargs={"k": 2})
+# Every generation goes through the shared scheduler (concurrency cap,
+# priority queue, coalescing of identical in-flight prompts)
+answer_llm = ScheduledLLM(llm, PRIORITY_INTERACTIVE)
+summary_llm = ScheduledLLM(llm, PRIORITY_SUMMARY)
+reranker = get_reranker()
+
+# --- Shared Embeddings & Vector Stores (registry.py) ---
+# Loaded on first use (or by main.py's startup warm-up), never at import.
+# Document chunks are searched by hybrid_search.py, and preferences by the
+# in-memory preference index; the query embedding model is shared with
+# ingest.py, and repeated questions are served from its LRU query cache.
+
+# --- Prompt Packing ---
+# Context, summary and preferences share a token budget (context_packer.py);
+# overlapping chunks from the same page are merged and duplicates dropped.
+def pack_prompt_inputs(input_dict):
+    packed = pack_prompt_parts(input_dict['docs'], input_dict['preference_docs'], input_dict['summary'])
+    tokens = packed.pop("tokens")
+    print(f"📦 Packed prompt parts (tokens): {tokens}")
+    return {**packed, "question": input_dict['question']}
+
+def log_prompt_size(prompt_value):
+    print(f"📏 Prompt size: ~{count_tokens(prompt_value.to_string())} tokens")
+    return prompt_value
 
-def format_docs(docs):
-    return "\n\n".join(doc.page_content for doc in docs)
+# --- Relevance Cut-off ---
+# Cosine distance (0 = identical) above which a retrieved chunk or preference is
+# treated as unrelated. If nothing clears it, the question is out of scope and
+# the canned answer is returned without calling the LLM at all.
+RAG_MAX_DISTANCE = float(os.getenv("RAG_MAX_DISTANCE", "0.65"))
 
 # --- Summarizer Chain ---
+# Incremental: folds only the messages added since the last checkpoint into the
+# stored summary (see summarize_history below).
+NO_SUMMARY = "No summary yet"
 summarizer_prompt = ChatPromptTemplate.from_messages([
-    MessagesPlaceholder(variable_name="chat_history"),
-    ("user", "Summarize the conversation focusing on user questions and preferences. If none, say 'No summary yet'.")
+    ("system", "Summary of the conversation so far:\n{summary}"),
+    MessagesPlaceholder(variable_name="new_messages"),
+    ("user", "Update the summary with the new messages above, focusing on user questions and preferences. Reply with the updated summary only. If none, say 'No summary yet'.")
 ])
-summarization_chain = summarizer_prompt | llm | StrOutputParser()
+summarization_chain = summarizer_prompt | summary_llm | StrOutputParser()
 
 # --- Preference Extractor ---
-class Preference(BaseModel):
-    fact: Optional[str] = Field(description="A single fact or preference learned about the user.")
-extractor_parser = JsonOutputParser(pydantic_object=Preference)
-extractor_prompt = ChatPromptTemplate.from_template(
-    "Analyze:\nUser: {question}\nAI: {answer}\nIf a new permanent fact or preference is learned, output it. Else null.\n{format_instructions}"
-)
-preference_extraction_chain = extractor_prompt | llm | extractor_parser
+# Runs out of band: /bot/ask only queues the (question, answer) pair and
+# preference_worker.py extracts and embeds facts in batches.
 
 # --- RAG Template (Stricter) ---
 rag_template = """
@@ -91,53 +109,113 @@ Question:
 Answer:
 """
 prompt = ChatPromptTemplate.from_template(rag_template)
+NO_INFO_ANSWER = "I'm sorry, I don't have that information."
+
+# --- Embed the Question (once per request) ---
+# Every retriever below searches by this vector instead of re-embedding the text.
+async def embed_question(input_dict):
+    if input_dict.get('question_vector') is not None:
+        return input_dict['question_vector'] # Already embedded by the endpoint (answer cache check)
+    return await get_shared_embeddings().aembed_query(input_dict['question'])
+
+# --- Retrieve Documents ---
+# Returns [(doc, distance)]: full-text and vector candidates fused (hybrid_search.py),
+# keeping only chunks within RAG_MAX_DISTANCE unless they match an exact code.
+async def retrieve_docs(input_dict):
+    return await hybrid_search(
+        COLLECTION_NAME_DOCS, input_dict['question'], input_dict['question_vector'],
+        k=RERANK_CANDIDATES if RERANK_ENABLED else 3, max_distance=RAG_MAX_DISTANCE
+    )
+
+# --- Rerank Documents ---
+# The over-fetched candidates are scored by a local cross-encoder (reranker.py);
+# only the best few above RERANK_MIN_SCORE go into the prompt.
+async def rerank_docs(input_dict):
+    if not RERANK_ENABLED:
+        return input_dict['docs']
+    return await reranker.arerank(input_dict['question'], input_dict['docs'])
 
 # --- Retrieve User Preferences ---
-def retrieve_and_format_preferences(input_dict):
-    user_id = input_dict['user_id']
-    question = input_dict['question']
-    user_pref_retriever = preference_store.as_retriever(
-        search_type="similarity",
-        search_kwargs={"k": 2},
-        filter={"user_id": user_id}
+# Returns [(doc, distance)] for the user's two closest facts, scored in memory
+# by the per-user preference index (no vector query per turn).
+async def retrieve_preferences(input_dict):
+    if input_dict.get('preference_docs') is not None:
+        return input_dict['preference_docs'] # Already fetched by the endpoint (answer cache check)
+    return await preference_index.search(input_dict['user_id'], input_dict['question_vector'], k=2)
+
+def has_relevant_material(input_dict) -> bool:
+    return bool(input_dict['docs']) or any(
+        distance <= RAG_MAX_DISTANCE for _, distance in input_dict['preference_docs']
     )
-    docs = user_pref_retriever.invoke(question)
-    return format_docs(docs)
+
+async def no_info_answer(input_dict):
+    print(f"⚪ Nothing within distance {RAG_MAX_DISTANCE} or above the rerank cut-off for: {input_dict['question']} (LLM skipped)")
+    return NO_INFO_ANSWER
+
+# --- Rolling Chat Summary ---
+async def summarize_history(input_dict, config):
+    history = input_dict['history']
+    if not history:
+        return NO_SUMMARY # First turn: nothing to summarize
+    session_id = config["configurable"]["session_id"]
+    summary, summarized = await load_summary(session_id)
+    if summarized > len(history):
+        # History was cleared or rewritten; start over
+        summary, summarized = "", 0
+
+    new_messages = history[summarized:]
+    if not new_messages:
+        return summary or NO_SUMMARY
+
+    summary = (await summarization_chain.ainvoke({
+        "summary": summary or NO_SUMMARY,
+        "new_messages": new_messages
+    })).strip()
+    await save_summary(session_id, summary, len(history))
+    return summary
 
 # --- Core RAG Chain ---
-rag_chain_core = (
-    RunnableParallel(
-        context=(RunnableLambda(lambda x: x['question']) | doc_retriever | format_docs),
-        preferences=RunnableLambda(retrieve_and_format_preferences),
-        summarized_history=(RunnableLambda(lambda x: {"chat_history": x['history']}) | summarization_chain),
-        question=RunnableLambda(lambda x: x['question'])
-    )
+# Retrieval runs first so out-of-scope questions can skip the summarizer and
+# the LLM entirely.
+rag_generation = (
+    RunnablePassthrough.assign(summary=RunnableLambda(summarize_history))
+    | RunnableLambda(pack_prompt_inputs)
     | prompt
-    | llm
+    | RunnableLambda(log_prompt_size)
+    | answer_llm
     | StrOutputParser()
 )
 
+rag_chain_core = (
+    RunnablePassthrough.assign(question_vector=RunnableLambda(embed_question))
+    | RunnablePassthrough.assign(
+        docs=RunnableLambda(retrieve_docs),
+        preference_docs=RunnableLambda(retrieve_preferences)
+    )
+    | RunnablePassthrough.assign(docs=RunnableLambda(rerank_docs))
+    | RunnableBranch(
+        (has_relevant_material, rag_generation),
+        RunnableLambda(no_info_answer)
+    )
+)
+
 # --- Chat History in Postgres (FIXED) ---
 # This function is now the factory for the session history
 def get_session_history(session_id: str):
-    return PostgresChatMessageHistory(
-        connection_string=DB_CONNECTION_STRING, # Uses standard .env string
+    return AsyncPostgresChatMessageHistory(
         session_id=session_id,
+        connection_string=DB_CONNECTION_STRING, # Uses standard .env string
         table_name="bot_chat_history" # Connects to your new table
     )
 
 # --- Helper: Fetch username from DB (FIXED) ---
-def get_username_from_db(user_id: str) -> str:
+async def get_username_from_db(conn, user_id: str) -> str:
     try:
-        # Connects using the standard .env string
-        conn = psycopg2.connect(DB_CONNECTION_STRING) 
-        cur = conn.cursor()
-        cur.execute("SELECT name FROM users WHERE id = %s", (user_id,))
-        row = cur.fetchone()
-        cur.close()
-        conn.close()
+        async with conn.cursor() as cur:
+            await cur.execute("SELECT name FROM users WHERE id = %s", (user_id,))
+            row = await cur.fetchone()
         if row:
-            return row[0]
+            return row["name"]
         return "Unknown User"
     except Exception as e:
         print(f"⚠️ Failed to fetch username: {e}")
@@ -160,13 +238,114 @@ class QueryRequest(BaseModel):
     question: str
     session_id: Optional[str] = None # Now accepts a session_id
 
-# --- Helper: DB Connection for API endpoints ---
-def get_db_conn_for_api():
+# --- Helper: Create or verify the chat_sessions row ---
+async def open_chat_session(conn, session_id: Optional[str], user_id: str, query: str):
+    """Returns (session_id, new_session_id). new_session_id is None for an existing chat."""
+    if not session_id:
+        # This is a new chat
+        new_session_id = str(uuid.uuid4())
+        title = query[:50] + "..." if len(query) > 50 else query
+        await conn.execute(
+            "INSERT INTO chat_sessions (session_id, user_id, title) VALUES (%s, %s, %s)",
+            (new_session_id, user_id, title)
+        )
+        await conn.commit() # This commit fixes the ForeignKeyViolation
+        return new_session_id, new_session_id
+
+    # This is an existing chat. Verify the user owns this session.
+    cur = await conn.execute(
+        "SELECT 1 FROM chat_sessions WHERE session_id = %s AND user_id = %s",
+        (session_id, user_id)
+    )
+    if not await cur.fetchone():
+        raise HTTPException(status_code=403, detail="Not authorized for this session")
+    return session_id, None
+
+# --- Helper: Queue a (question, answer) pair for preference extraction ---
+async def queue_preference_extraction(query: str, answer: str, user_id: str, intent: Optional[str] = None):
+    if answer == NO_INFO_ANSWER:
+        return # Out-of-scope turn (possibly short-circuited); not worth an extraction call
+    if intent:
+        return # Answered from the user's own records; nothing to learn (and the numbers go stale)
+    try:
+        async with async_connection() as conn:
+            await enqueue_preference_job(conn, user_id, query, answer)
+    except Exception as e:
+        print(f"Error queueing preference extraction: {e}")
+
+# --- Answer Cache Helpers ---
+async def check_answer_cache(conn, chain_input: dict, is_new_session: bool):
+    """
+    Only context-free turns are cacheable: the first question of a session, from
+    a user with no stored preferences. Returns (cached_answer, cache_key).
+    cache_key is None when the turn is not cacheable; otherwise pass it to
+    save_to_answer_cache() after a miss.
+    """
+    if not ANSWER_CACHE_ENABLED or not is_new_session:
+        return None, None
     try:
-        return psycopg2.connect(DB_CONNECTION_STRING)
+        question_vector = await embed_question(chain_input)
+        chain_input["question_vector"] = question_vector
+        chain_input["preference_docs"] = await retrieve_preferences(chain_input)
+        if chain_input["preference_docs"]:
+            return None, None
+        cached_answer, generation = await lookup_answer(conn, question_vector)
+        return cached_answer, (question_vector, generation)
     except Exception as e:
-        print(f"API DB Connection Error: {e}")
+        print(f"⚠️ Answer cache lookup failed: {e}")
+        await conn.rollback()
+        return None, None
+
+async def save_to_answer_cache(cache_key, query: str, answer: str, llm_seconds: float):
+    question_vector, generation = cache_key
+    try:
+        async with async_connection() as conn:
+            await store_answer(conn, query, question_vector, answer, llm_seconds, generation)
+    except Exception as e:
+        print(f"⚠️ Failed to store answer in cache: {e}")
+
+async def save_cached_turn(session_id: str, query: str, answer: str):
+    """Cache hits skip the chain, so write the turn to bot_chat_history ourselves."""
+    await get_session_history(session_id).aadd_messages(
+        [HumanMessage(content=query), AIMessage(content=answer)]
+    )
+
+# --- Structured Questions (rewards, mentor, ticket status) ---
+async def check_structured_answer(conn, chain_input: dict) -> Optional[str]:
+    """Answers from SQL when the question is about the user's own records (structured_answers.py)."""
+    try:
+        structured = await answer_structured(conn, chain_input["question"], chain_input["user_id"])
+    except Exception as e:
+        print(f"⚠️ Structured answer failed, falling back to RAG: {e}")
+        await conn.rollback()
         return None
+    if structured is None:
+        return None
+    print(f"⚡ Structured answer ({structured['intent']}) for: {chain_input['question']}")
+    chain_input["intent"] = structured["intent"]
+    return structured["answer"]
+
+# --- Helper: Everything that happens before the LLM call ---
+async def prepare_turn(query: str, user_id: str, session_id: Optional[str]):
+    """Returns (session_id, new_session_id, chain_input, cached_answer, cache_key)."""
+    async with async_connection() as conn:
+        username = await get_username_from_db(conn, user_id)
+        print(f"🟢 User '{username}' asked: {query}")
+
+        session_id, new_session_id = await open_chat_session(conn, session_id, user_id, query)
+
+        chain_input = {"question": query, "user_id": user_id}
+        structured = await check_structured_answer(conn, chain_input)
+        if structured is not None:
+            # Served like a cached answer: no embedding, retrieval or LLM call
+            return session_id, new_session_id, chain_input, structured, None
+        cached_answer, cache_key = await check_answer_cache(conn, chain_input, new_session_id is not None)
+    # The connection is back in the pool before the (long) LLM call
+    return session_id, new_session_id, chain_input, cached_answer, cache_key
+
+def is_no_info_answer(answer: str) -> bool:
+    lowered = answer.lower()
+    return "i'm sorry" in lowered and "don't have that information" in lowered
 
 # --- Main /ask Endpoint (FIXED for Session Management) ---
 @router.post("/ask")
@@ -178,62 +357,27 @@ async def ask_question(request: QueryRequest, user_id: str = Depends(get_current
     if not query:
         raise HTTPException(status_code=400, detail="Question cannot be empty")
 
-    conn = None
     try:
-        username = get_username_from_db(user_id)
-        print(f"🟢 User '{username}' asked: {query}")
-        
-        conn = get_db_conn_for_api()
-        if not conn:
-            raise HTTPException(status_code=500, detail="Database connection error")
-        
-        cur = conn.cursor(cursor_factory=RealDictCursor)
-        
-        # --- Session Creation Logic (FIXED) ---
-        if not session_id:
-            # This is a new chat
-            new_session_id = str(uuid.uuid4())
-            session_id = new_session_id 
-            
-            title = query[:50] + "..." if len(query) > 50 else query
-            
-            cur.execute(
-                "INSERT INTO chat_sessions (session_id, user_id, title) VALUES (%s, %s, %s)",
-                (session_id, user_id, title)
-            )
-            conn.commit() # This commit fixes the ForeignKeyViolation
+        session_id, new_session_id, chain_input, cached_answer, cache_key = await prepare_turn(
+            query, user_id, session_id
+        )
+
+        if cached_answer is not None:
+            answer = cached_answer
+            await save_cached_turn(session_id, query, answer)
         else:
-            # This is an existing chat. Verify the user owns this session.
-            cur.execute(
-                "SELECT * FROM chat_sessions WHERE session_id = %s AND user_id = %s",
-                (session_id, user_id)
-            )
-            if not cur.fetchone():
-                raise HTTPException(status_code=403, detail="Not authorized for this session")
-        # --- End of Session Logic ---
-
-        # --- RAG Chain Query (FIXED) ---
-        # We now pass the correct session_id to the config
-        answer = chain_with_chat_history.invoke(
-            {"question": query, "user_id": user_id},
-            config={"configurable": {"session_id": session_id}} 
-        ).strip()
-
-        # --- Preference Extraction (Copied from your file) ---
-        try:
-            preference_result = preference_extraction_chain.invoke({
-                "question": query, "answer": answer,
-                "format_instructions": extractor_parser.get_format_instructions()
-            })
-            if preference_result and preference_result.get("fact"):
-                fact = preference_result["fact"]
-                pref_doc = Document(
-                    page_content=fact,
-                    metadata={"user_id": user_id}
-                )
-                preference_store.add_documents([pref_doc])
-        except Exception as extraction_err:
-            print(f"Error during preference extraction: {extraction_err}")
+            # --- RAG Chain Query (FIXED) ---
+            # We now pass the correct session_id to the config
+            started = time.perf_counter()
+            answer = (await chain_with_chat_history.ainvoke(
+                chain_input,
+                config={"configurable": {"session_id": session_id}} 
+            )).strip()
+            if cache_key:
+                await save_to_answer_cache(cache_key, query, answer, time.perf_counter() - started)
+
+        # --- Preference Extraction (handled by preference_worker.py) ---
+        await queue_preference_extraction(query, answer, user_id, chain_input.get("intent"))
         
         # --- SMS Logic (REMOVED) ---
         # All the Twilio/SMS/Complaint logic was removed
@@ -241,18 +385,127 @@ async def ask_question(request: QueryRequest, user_id: str = Depends(get_current
 
         # --- Strict Missing Info Alert (REMOVED) ---
         # This was also part of the complaint logic
-        if ("i'm sorry" in answer.lower() and "don't have that information" in answer.lower()):
-            return {"answer": "I'm sorry, I don't have that information."}
+        if is_no_info_answer(answer):
+            return {"answer": NO_INFO_ANSWER}
 
         # --- Return (FIXED) ---
         # Return the answer AND the session_id
         return {"answer": answer, "new_session_id": new_session_id, "session_id": session_id}
 
+    except HTTPException:
+        raise
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        raise HTTPException(status_code=500, detail=f"Error: {e}")
+
+# --- Streaming /ask Endpoint (Server-Sent Events) ---
+# Same pipeline as /ask, but tokens are pushed to the client as soon as llama3.1
+# produces them. Event types, in order:
+#   session  -> {"session_id", "new_session_id"}   (sent first)
+#   token    -> {"text"}                            (raw LLM chunks)
+#   sentence -> {"text"}                            (each finished sentence, for the voice flow)
+#   done     -> {"answer", "session_id", "new_session_id"}
+#   error    -> {"detail"}
+SENTENCE_BOUNDARY = re.compile(r"(?<=[.!?])\s+")
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+async def replay_cached_answer(session_id: str, query: str, answer: str):
+    await save_cached_turn(session_id, query, answer)
+    yield answer
+
+async def stream_answer(chain_input: dict, session_id: str, new_session_id: Optional[str],
+                        cached_answer: Optional[str] = None, cache_key=None):
+    query = chain_input["question"]
+    user_id = chain_input["user_id"]
+    yield sse_event("session", {"session_id": session_id, "new_session_id": new_session_id})
+
+    if cached_answer is not None:
+        source = replay_cached_answer(session_id, query, cached_answer)
+    else:
+        # RunnableWithMessageHistory saves the (question, answer) pair to
+        # bot_chat_history once the stream has finished.
+        source = chain_with_chat_history.astream(
+            chain_input,
+            config={"configurable": {"session_id": session_id}}
+        )
+
+    answer_parts = []
+    pending = ""
+    started = time.perf_counter()
+    try:
+        async for token in source:
+            if not token:
+                continue
+            answer_parts.append(token)
+            yield sse_event("token", {"text": token})
+
+            pending += token
+            sentences = SENTENCE_BOUNDARY.split(pending)
+            pending = sentences.pop()
+            for sentence in sentences:
+                if sentence.strip():
+                    yield sse_event("sentence", {"text": sentence.strip()})
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        yield sse_event("error", {"detail": f"Error: {e}"})
+        return
+
+    if pending.strip():
+        yield sse_event("sentence", {"text": pending.strip()})
+
+    answer = "".join(answer_parts).strip()
+    final_answer = NO_INFO_ANSWER if is_no_info_answer(answer) else answer
+    yield sse_event("done", {"answer": final_answer, "session_id": session_id, "new_session_id": new_session_id})
+
+    if cached_answer is None and cache_key:
+        await save_to_answer_cache(cache_key, query, answer, time.perf_counter() - started)
+
+    # Runs after the client already has the full answer.
+    await queue_preference_extraction(query, answer, user_id, chain_input.get("intent"))
+
+@router.post("/ask/stream")
+async def ask_question_stream(request: QueryRequest, user_id: str = Depends(get_current_user_id)):
+    query = request.question.strip()
+    if not query:
+        raise HTTPException(status_code=400, detail="Question cannot be empty")
+
+    try:
+        session_id, new_session_id, chain_input, cached_answer, cache_key = await prepare_turn(
+            query, user_id, request.session_id
+        )
+    except HTTPException:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Error: {e}")
-    finally:
-        if conn:
-            cur.close()
-            conn.close()
+
+    return StreamingResponse(
+        stream_answer(chain_input, session_id, new_session_id, cached_answer, cache_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+# --- Bot Stats (Admin) ---
+@router.get("/stats")
+async def bot_stats(admin_id: str = Depends(get_current_admin_user)):
+    try:
+        async with async_connection() as conn:
+            answer_cache = await get_cache_stats(conn)
+        return {
+            "answer_cache": answer_cache,
+            "query_embedding_cache": get_shared_embeddings().stats(),
+            "llm_scheduler": llm_scheduler.stats(),
+            "preference_index": preference_index.stats(),
+            "reranker": reranker.stats(),
+            "structured_answers": structured_stats,
+            "db_pool": pool_stats(),
+            "process": process_stats(),
+        }
+    except Exception as e:
+        print(f"Error fetching bot stats: {e}")
+        raise HTTPException(status_code=500, detail="Failed to fetch bot stats.")
@@ -1,6 +1,5 @@
 import os
 from jose import jwt
-import psycopg2
 import json
 from psycopg2.extras import RealDictCursor
 from datetime import datetime, timedelta, timezone
@@ -11,6 +10,7 @@ from dotenv import load_dotenv
 from google.oauth2 import id_token
 from google.auth.transport import requests as google_requests
 from starlette.responses import JSONResponse
+from db import get_connection, release_connection
 
 load_dotenv()
 router = APIRouter()
@@ -33,11 +33,9 @@ security_scheme = HTTPBearer()
 # --- 2. HELPER FUNCTIONS ---
 
 def get_db_connection():
-    """Establishes a connection to the PostgreSQL database."""
+    """Borrows a connection from the shared pool (give it back with release_connection)."""
     try:
-        # Use the single connection string
-        conn = psycopg2.connect(DB_URL) 
-        return conn
+        return get_connection()
     except Exception as e:
         print(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection error.")
@@ -108,7 +106,7 @@ def get_current_admin_user(payload: dict = Depends(get_current_user_payload)) ->
 # --- 4. API ENDPOINTS ---
 
 @router.post("/gsi_login")
-async def gsi_login(request: Request, body: GoogleToken):
+def gsi_login(request: Request, body: GoogleToken):
     """Handles the Google Sign-In (GSI) credential from the frontend."""
     token = body.token
     if not token:
@@ -182,10 +180,10 @@ async def gsi_login(request: Request, body: GoogleToken):
     finally:
         if conn:
             cur.close()
-            conn.close()
+            release_connection(conn)
 
 @router.get("/users")
-async def get_user_list(admin_id: str = Depends(get_current_admin_user)):
+def get_user_list(admin_id: str = Depends(get_current_admin_user)):
     conn = None
     try:
         conn = get_db_connection()
@@ -209,13 +207,13 @@ async def get_user_list(admin_id: str = Depends(get_current_admin_user)):
     finally:
         if conn:
             cur.close()
-            conn.close()
+            release_connection(conn)
 
 #
 # --- THIS IS THE CORRECTED REWARD POINTS FUNCTION ---
 #
 @router.get("/reward-points")
-async def get_reward_data(payload: dict = Depends(get_current_user_payload)):
+def get_reward_data(payload: dict = Depends(get_current_user_payload)):
     """
     Fetches the student's reward points.
     This endpoint now works for BOTH parents and students.
@@ -268,13 +266,13 @@ async def get_reward_data(payload: dict = Depends(get_current_user_payload)):
     finally:
         if conn:
             cur.close()
-            conn.close()
+            release_connection(conn)
 
 #
 # --- CHAT SESSION ENDPOINTS ---
 #
 @router.get("/chat/sessions")
-async def get_chat_sessions(payload: dict = Depends(get_current_user_payload)):
+def get_chat_sessions(payload: dict = Depends(get_current_user_payload)):
     user_id = payload.get("sub")
     conn = None
     try:
@@ -297,10 +295,10 @@ async def get_chat_sessions(payload: dict = Depends(get_current_user_payload)):
     finally:
         if conn:
             cur.close()
-            conn.close()
+            release_connection(conn)
 
 @router.get("/chat/history/{session_id}")
-async def get_chat_history(session_id: str, payload: dict = Depends(get_current_user_payload)):
+def get_chat_history(session_id: str, payload: dict = Depends(get_current_user_payload)):
     user_id = payload.get("sub")
     conn = None
     try:
@@ -327,4 +325,4 @@ async def get_chat_history(session_id: str, payload: dict = Depends(get_current_
     finally:
         if conn:
             cur.close()
-            conn.close()
\ No newline at end of file
+            release_connection(conn)
\ No newline at end of file
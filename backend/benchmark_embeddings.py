@@ -0,0 +1,92 @@
+import sys
+import time
+import numpy as np
+from db import get_connection, release_connection
+from embedding_engines import ENGINE_MODEL_KWARGS, build_embeddings
+
+# --- Embedding engine benchmark ---
+# Embeds the same texts with every engine and reports throughput, single-query
+# latency and how far each engine's vectors drift from the torch reference
+# (1 - cosine similarity). Texts come from a file (one per line) or, by
+# default, a sample of the chunks already stored in langchain_pg_embedding.
+#   python benchmark_embeddings.py [texts.txt] [engine ...]
+SAMPLE_SIZE = 1000
+QUERY_SAMPLE_SIZE = 50
+BATCH_SIZE = 64
+
+
+def load_texts(path=None):
+    if path:
+        with open(path, encoding="utf-8") as f:
+            return [line.strip() for line in f if line.strip()]
+    conn = get_connection()
+    try:
+        with conn.cursor() as curs:
+            curs.execute(
+                "SELECT document FROM langchain_pg_embedding ORDER BY random() LIMIT %s", (SAMPLE_SIZE,)
+            )
+            return [row[0] for row in curs.fetchall()]
+    finally:
+        conn.rollback()
+        release_connection(conn)
+
+
+def run_engine(engine, texts):
+    started = time.perf_counter()
+    # No silent torch fallback: its numbers would be reported under this engine's name
+    model = build_embeddings(engine, BATCH_SIZE, fallback=False)
+    model.embed_documents(texts[:BATCH_SIZE])  # warm-up
+    load_seconds = time.perf_counter() - started
+
+    started = time.perf_counter()
+    vectors = np.asarray(model.embed_documents(texts), dtype=np.float64)
+    batch_seconds = time.perf_counter() - started
+
+    queries = texts[:QUERY_SAMPLE_SIZE]
+    started = time.perf_counter()
+    for text in queries:
+        model.embed_query(text)
+    query_ms = 1000 * (time.perf_counter() - started) / len(queries)
+    return vectors, {
+        "load_s": load_seconds,
+        "texts_per_s": len(texts) / batch_seconds,
+        "query_ms": query_ms,
+    }
+
+
+def cosine_drift(reference, vectors):
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    drift = 1.0 - np.sum(reference * vectors, axis=1)
+    return float(drift.mean()), float(drift.max())
+
+
+if __name__ == "__main__":
+    args = sys.argv[1:]
+    path = args.pop(0) if args and args[0] not in ENGINE_MODEL_KWARGS else None
+    # torch always runs first: it is the reference for drift
+    engines = ["torch"] + [engine for engine in args or ENGINE_MODEL_KWARGS if engine != "torch"]
+
+    texts = load_texts(path)
+    if not texts:
+        print("❌ No texts to embed (empty file or no stored chunks).")
+        sys.exit(1)
+    print(f"📊 Benchmarking {len(texts)} texts on: {', '.join(engines)}\n")
+
+    reference = None
+    print(f"{'engine':<10} {'load s':>8} {'texts/s':>9} {'query ms':>9} {'mean drift':>11} {'max drift':>10}")
+    for engine in engines:
+        try:
+            vectors, result = run_engine(engine, texts)
+        except Exception as e:
+            if engine == "torch":
+                raise
+            print(f"{engine:<10} ❌ unavailable: {e}")
+            continue
+        if reference is None:
+            reference = vectors
+        mean_drift, max_drift = cosine_drift(reference, vectors)
+        print(
+            f"{engine:<10} {result['load_s']:>8.1f} {result['texts_per_s']:>9.1f} {result['query_ms']:>9.2f} "
+            f"{mean_drift:>11.6f} {max_drift:>10.6f}"
+        )
@@ -0,0 +1,197 @@
+import io
+import csv
+import json
+import time
+import uuid
+import hashlib
+from collections import defaultdict
+from typing import Callable, List, Optional
+from psycopg2.extras import execute_values
+from langchain_core.documents import Document
+from db import get_connection, release_connection
+
+# --- Bulk Chunk Writer ---
+# PGVector.add_documents() embeds and inserts through SQLAlchemy one statement
+# per chunk. For ingestion we instead:
+#   1. embed chunks in batches of `batch_size` (embed_documents per batch)
+#   2. COPY each embedded batch into a temp staging table as CSV
+#   3. merge the staging table into langchain_pg_embedding in one statement
+# and commit each batch on its own. A job that dies halfway keeps the batches
+# it already wrote: when it is resumed, the id diff counts them as kept and
+# only the rest is embedded. Metadata refreshes and deletes of vanished chunks
+# run last, in one transaction, once every new chunk is stored.
+# Rows are written exactly as PGVector writes them (id, collection_id,
+# embedding, document, cmetadata), so the bot reads them like any other row.
+#
+# Re-uploads are incremental: a chunk's id is derived from its source and
+# content hash, so unchanged chunks keep their id and their embedding. Only
+# new ids are embedded, and ids no longer produced by the file are deleted.
+
+STAGING_TABLE_SQL = """
+    CREATE TEMP TABLE ingest_staging (
+        id TEXT,
+        document TEXT,
+        cmetadata TEXT,
+        embedding TEXT
+    ) ON COMMIT DROP
+"""
+
+MERGE_SQL = """
+    INSERT INTO langchain_pg_embedding (id, collection_id, embedding, document, cmetadata)
+    SELECT id, %s, embedding::vector, document, cmetadata::jsonb
+    FROM ingest_staging
+    ON CONFLICT (id) DO UPDATE SET
+        collection_id = EXCLUDED.collection_id,
+        embedding = EXCLUDED.embedding,
+        document = EXCLUDED.document,
+        cmetadata = EXCLUDED.cmetadata
+"""
+
+
+# --- Chunk identity ---
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def assign_chunk_ids(chunks: List[Document], source: str) -> List[str]:
+    """
+    Stores content_hash/chunk_id in each chunk's metadata and returns the ids.
+    Identical chunks within one file are told apart by their occurrence number.
+    """
+    occurrences = defaultdict(int)
+    chunk_ids = []
+    for chunk in chunks:
+        digest = content_hash(chunk.page_content)
+        n = occurrences[digest]
+        occurrences[digest] += 1
+        chunk_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"{source}:{digest}:{n}"))
+        chunk.metadata["content_hash"] = digest
+        chunk.metadata["chunk_id"] = chunk_id
+        chunk_ids.append(chunk_id)
+    return chunk_ids
+
+
+def get_collection_id(conn, collection_name: str):
+    with conn.cursor() as curs:
+        curs.execute("SELECT uuid FROM langchain_pg_collection WHERE name = %s", (collection_name,))
+        row = curs.fetchone()
+    if not row:
+        # PGVector creates the collection when the store is constructed
+        raise RuntimeError(f"Vector collection '{collection_name}' does not exist")
+    return row[0]
+
+
+def diff_source_chunks(conn, collection_id, source: str, chunk_ids: List[str]):
+    """Returns (positions of new chunks, positions of kept chunks, ids to remove)."""
+    with conn.cursor() as curs:
+        curs.execute(
+            # Served by idx_langchain_pg_embedding_source (document_catalog.py)
+            "SELECT id FROM langchain_pg_embedding WHERE collection_id = %s AND cmetadata->>'source' = %s",
+            (str(collection_id), source)
+        )
+        existing = {row[0] for row in curs.fetchall()}
+    new_positions = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id not in existing]
+    kept_positions = [i for i, chunk_id in enumerate(chunk_ids) if chunk_id in existing]
+    removed_ids = list(existing - set(chunk_ids))
+    return new_positions, kept_positions, removed_ids
+
+
+# --- Writing ---
+def clean_text(value: str) -> str:
+    # Postgres text cannot hold NUL bytes, which some PDFs produce
+    return value.replace("\x00", "")
+
+
+def copy_batch(curs, ids: List[str], chunks: List[Document], vectors: List[List[float]]):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for chunk_id, chunk, vector in zip(ids, chunks, vectors):
+        writer.writerow([
+            chunk_id,
+            clean_text(chunk.page_content),
+            clean_text(json.dumps(chunk.metadata)),
+            "[" + ",".join(repr(float(x)) for x in vector) + "]",
+        ])
+    buffer.seek(0)
+    curs.copy_expert("COPY ingest_staging (id, document, cmetadata, embedding) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def refresh_kept_metadata(curs, ids: List[str], chunks: List[Document]):
+    # Unchanged text can still move to another page; refresh metadata without re-embedding
+    execute_values(
+        curs,
+        """
+        UPDATE langchain_pg_embedding AS e SET cmetadata = v.cmetadata::jsonb
+        FROM (VALUES %s) AS v(id, cmetadata)
+        WHERE e.id = v.id AND e.cmetadata <> v.cmetadata::jsonb
+        """,
+        [(chunk_id, clean_text(json.dumps(chunk.metadata))) for chunk_id, chunk in zip(ids, chunks)],
+        page_size=1000
+    )
+
+
+def sync_source_chunks(
+    chunks: List[Document],
+    ids: List[str],
+    source: str,
+    collection_name: str,
+    embedding_model,
+    batch_size: int,
+    on_progress: Optional[Callable[[int], None]] = None,
+) -> dict:
+    """
+    Makes the stored chunks of `source` match `chunks`: new chunks are
+    embedded and inserted batch by batch, unchanged ones are kept, vanished
+    ones are deleted. Returns added/kept/removed counts and throughput.
+    """
+    embed_seconds = 0.0
+    write_seconds = 0.0
+    started = time.perf_counter()
+    conn = get_connection()
+    try:
+        collection_id = get_collection_id(conn, collection_name)
+        new_positions, kept_positions, removed_ids = diff_source_chunks(conn, collection_id, source, ids)
+        conn.rollback()  # no transaction stays open while embedding
+        new_chunks = [chunks[i] for i in new_positions]
+        new_ids = [ids[i] for i in new_positions]
+
+        for offset in range(0, len(new_chunks), batch_size):
+            batch = new_chunks[offset:offset + batch_size]
+            t0 = time.perf_counter()
+            vectors = embedding_model.embed_documents([chunk.page_content for chunk in batch])
+            t1 = time.perf_counter()
+            with conn.cursor() as curs:
+                curs.execute(STAGING_TABLE_SQL)
+                copy_batch(curs, new_ids[offset:offset + batch_size], batch, vectors)
+                curs.execute(MERGE_SQL, (str(collection_id),))
+            conn.commit()  # a resumed job starts after this batch
+            embed_seconds += t1 - t0
+            write_seconds += time.perf_counter() - t1
+            if on_progress:
+                on_progress(offset + len(batch))
+
+        t0 = time.perf_counter()
+        with conn.cursor() as curs:
+            if kept_positions:
+                refresh_kept_metadata(curs, [ids[i] for i in kept_positions], [chunks[i] for i in kept_positions])
+            if removed_ids:
+                curs.execute("DELETE FROM langchain_pg_embedding WHERE id = ANY(%s)", (removed_ids,))
+        conn.commit()
+        write_seconds += time.perf_counter() - t0
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_connection(conn)
+
+    total_seconds = time.perf_counter() - started
+    return {
+        "mode": "copy",
+        "added": len(new_ids),
+        "kept": len(kept_positions),
+        "removed": len(removed_ids),
+        "embed_seconds": round(embed_seconds, 3),
+        "write_seconds": round(write_seconds, 3),
+        "total_seconds": round(total_seconds, 3),
+        "chunks_per_sec": round(len(new_ids) / total_seconds, 2) if total_seconds else 0.0,
+    }
@@ -0,0 +1,94 @@
+import psycopg
+from psycopg import sql
+from psycopg.types.json import Jsonb
+from typing import List, Sequence
+from langchain_core.chat_history import BaseChatMessageHistory
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+from db import async_connection
+
+# --- Async Chat History for the bot_chat_history table ---
+# Drop-in replacement for langchain_community's PostgresChatMessageHistory.
+# It reads and writes the same JSONB rows, but the async methods (used by
+# RunnableWithMessageHistory.ainvoke/astream) never block the event loop.
+class AsyncPostgresChatMessageHistory(BaseChatMessageHistory):
+    def __init__(self, session_id: str, connection_string: str, table_name: str = "bot_chat_history"):
+        self.session_id = session_id
+        self.connection_string = connection_string
+        self._select_sql = sql.SQL(
+            "SELECT message FROM {} WHERE session_id = %s ORDER BY id"
+        ).format(sql.Identifier(table_name))
+        self._insert_sql = sql.SQL(
+            "INSERT INTO {} (session_id, message) VALUES (%s, %s)"
+        ).format(sql.Identifier(table_name))
+        self._delete_sql = sql.SQL(
+            "DELETE FROM {} WHERE session_id = %s"
+        ).format(sql.Identifier(table_name))
+
+    # --- Async API (used by the /bot/ask pipeline) ---
+    async def aget_messages(self) -> List[BaseMessage]:
+        async with async_connection() as conn:
+            cur = await conn.execute(self._select_sql, (self.session_id,))
+            rows = await cur.fetchall()
+        return messages_from_dict([row["message"] for row in rows])
+
+    async def aadd_messages(self, messages: Sequence[BaseMessage]) -> None:
+        async with async_connection() as conn:
+            async with conn.cursor() as cur:
+                await cur.executemany(
+                    self._insert_sql,
+                    [(self.session_id, Jsonb(message_to_dict(m))) for m in messages]
+                )
+
+    async def aclear(self) -> None:
+        async with async_connection() as conn:
+            await conn.execute(self._delete_sql, (self.session_id,))
+
+    # --- Sync API (kept for scripts and BaseChatMessageHistory compatibility) ---
+    @property
+    def messages(self) -> List[BaseMessage]:
+        with psycopg.connect(self.connection_string) as conn:
+            rows = conn.execute(self._select_sql, (self.session_id,)).fetchall()
+        return messages_from_dict([row[0] for row in rows])
+
+    def add_messages(self, messages: Sequence[BaseMessage]) -> None:
+        with psycopg.connect(self.connection_string) as conn:
+            with conn.cursor() as cur:
+                cur.executemany(
+                    self._insert_sql,
+                    [(self.session_id, Jsonb(message_to_dict(m))) for m in messages]
+                )
+
+    def clear(self) -> None:
+        with psycopg.connect(self.connection_string) as conn:
+            conn.execute(self._delete_sql, (self.session_id,))
+
+
+# --- Rolling Conversation Summaries (chat_summaries table) ---
+# One row per session: the summary text plus how many history messages have
+# already been folded into it, so each turn only summarizes what is new.
+async def load_summary(session_id: str):
+    """Returns (summary, messages_summarized); ("", 0) for a session without one."""
+    async with async_connection() as conn:
+        cur = await conn.execute(
+            "SELECT summary, messages_summarized FROM chat_summaries WHERE session_id = %s",
+            (session_id,)
+        )
+        row = await cur.fetchone()
+    if row:
+        return row["summary"], row["messages_summarized"]
+    return "", 0
+
+
+async def save_summary(session_id: str, summary: str, messages_summarized: int):
+    async with async_connection() as conn:
+        await conn.execute(
+            """
+            INSERT INTO chat_summaries (session_id, summary, messages_summarized, updated_at)
+            VALUES (%s, %s, %s, NOW())
+            ON CONFLICT (session_id) DO UPDATE SET
+                summary = EXCLUDED.summary,
+                messages_summarized = EXCLUDED.messages_summarized,
+                updated_at = NOW()
+            """,
+            (session_id, summary, messages_summarized)
+        )
@@ -0,0 +1,140 @@
+import os
+import re
+import math
+from typing import List, Tuple
+from langchain_core.documents import Document
+
+# --- Prompt Context Packer ---
+# Prompt length is what llama3.1 spends most of its CPU time on, so the
+# variable parts of rag_template are packed into a fixed token budget:
+#   - chunks from the same source/page that overlap (chunk_overlap=100) or
+#     repeat are merged/deduplicated before anything is counted
+#   - context, chat summary and preferences each get a share of the budget;
+#     whatever the summary and preferences leave unused goes to the context
+# Tokens are estimated at CHARS_PER_TOKEN characters each: llama3.1's own
+# tokenizer is not available locally, and ~4 characters per token holds well
+# enough for English text to budget with.
+PROMPT_TOKEN_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "1200"))
+SUMMARY_BUDGET_SHARE = float(os.getenv("PROMPT_SUMMARY_SHARE", "0.2"))
+PREFERENCES_BUDGET_SHARE = float(os.getenv("PROMPT_PREFERENCES_SHARE", "0.1"))
+CHARS_PER_TOKEN = 4
+MIN_OVERLAP_CHARS = 20
+MAX_OVERLAP_CHARS = 300
+MIN_PARTIAL_BLOCK_TOKENS = 50
+
+
+def count_tokens(text: str) -> int:
+    return math.ceil(len(text) / CHARS_PER_TOKEN)
+
+
+def truncate_to_tokens(text: str, max_tokens: int, keep: str = "head") -> str:
+    """Cuts `text` to about `max_tokens`, on a sentence or word boundary where possible."""
+    max_chars = max_tokens * CHARS_PER_TOKEN
+    if len(text) <= max_chars:
+        return text
+    if keep == "tail":
+        cut = text[-max_chars:]
+        boundary = re.search(r"(?<=[.!?])\s+", cut)
+        return cut[boundary.end():] if boundary else cut.split(" ", 1)[-1]
+    cut = text[:max_chars]
+    boundary = max(cut.rfind(". "), cut.rfind("\n"))
+    return cut[:boundary + 1] if boundary > max_chars // 2 else cut.rsplit(" ", 1)[0]
+
+
+def normalize(text: str) -> str:
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def overlap_length(first: str, second: str) -> int:
+    """Length of the longest suffix of `first` that is also a prefix of `second`."""
+    longest = min(len(first), len(second), MAX_OVERLAP_CHARS)
+    for size in range(longest, MIN_OVERLAP_CHARS - 1, -1):
+        if first.endswith(second[:size]):
+            return size
+    return 0
+
+
+# --- Merging and dedup ---
+def merge_chunks(docs: List[Document]) -> List[str]:
+    """
+    Returns text blocks in the order of `docs` (best first). Chunks from the
+    same source and page are stitched together where their text overlaps;
+    exact and contained duplicates are dropped.
+    """
+    blocks = []  # [[page key, text]]
+    for doc in docs:
+        text = doc.page_content.strip()
+        if not text:
+            continue
+        key = (doc.metadata.get("source"), doc.metadata.get("page_number"))
+        merged = False
+        for block in blocks:
+            current = block[1]
+            if normalize(text) in normalize(current):
+                merged = True  # duplicate, or already contained
+                break
+            if block[0] != key:
+                continue
+            if normalize(current) in normalize(text):
+                block[1] = text
+                merged = True
+                break
+            forward = overlap_length(current, text)
+            if forward:
+                block[1] = current + text[forward:]
+                merged = True
+                break
+            backward = overlap_length(text, current)
+            if backward:
+                block[1] = text + current[backward:]
+                merged = True
+                break
+        if not merged:
+            blocks.append([key, text])
+    return [text for _, text in blocks]
+
+
+def pack_blocks(blocks: List[str], budget: int) -> Tuple[str, int]:
+    packed, used = [], 0
+    for block in blocks:
+        tokens = count_tokens(block)
+        if used + tokens <= budget:
+            packed.append(block)
+            used += tokens
+            continue
+        remaining = budget - used
+        if remaining >= MIN_PARTIAL_BLOCK_TOKENS:
+            partial = truncate_to_tokens(block, remaining)
+            packed.append(partial)
+            used += count_tokens(partial)
+        break
+    return "\n\n".join(packed), used
+
+
+# --- Entry point ---
+def pack_prompt_parts(docs: List[Tuple[Document, float]], preference_docs: List[Tuple[Document, float]],
+                      summary: str, budget: int = PROMPT_TOKEN_BUDGET) -> dict:
+    """Returns the packed context/preferences/summary strings and their token counts."""
+    summary_budget = int(budget * SUMMARY_BUDGET_SHARE)
+    # The rolling summary grows from the start of the chat; keep its most recent part
+    summary_text = truncate_to_tokens(summary.strip(), summary_budget, keep="tail")
+    summary_tokens = count_tokens(summary_text)
+
+    preference_budget = int(budget * PREFERENCES_BUDGET_SHARE)
+    preferences_text, preference_tokens = pack_blocks(
+        merge_chunks([doc for doc, _ in preference_docs]), preference_budget
+    )
+
+    context_budget = budget - summary_tokens - preference_tokens
+    context_text, context_tokens = pack_blocks(merge_chunks([doc for doc, _ in docs]), context_budget)
+    return {
+        "context": context_text,
+        "preferences": preferences_text,
+        "summarized_history": summary_text,
+        "tokens": {
+            "context": context_tokens,
+            "preferences": preference_tokens,
+            "summary": summary_tokens,
+            "budget": budget,
+        },
+    }
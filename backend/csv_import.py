@@ -0,0 +1,257 @@
+import io
+import os
+import re
+import time
+import uuid
+from collections import defaultdict
+import pandas as pd
+from db import get_connection, release_connection
+
+# --- CSV Imports (student_rewards, student_directory) ---
+# Imports used to `to_sql(if_exists='replace')` and re-add the primary key,
+# so the table was gone (then unindexed) while /auth/reward-points and the
+# Google login looked students up in it. Now every import:
+#   1. COPYs the validated CSV, chunk by chunk, into a temp staging table
+#   2. merges staging into the live table with INSERT ... ON CONFLICT,
+#      touching only rows whose values changed
+# in one transaction, so readers see the old rows until the commit and the
+# table keeps its indexes and constraints throughout.
+
+REWARDS_TABLE = "student_rewards"
+REWARDS_COLUMNS = [
+    "sl_no", "year", "roll_no", "student_name", "course_code", "department",
+    "mentor_name", "cumulative_reward_points", "redeemed_points", "balance_points",
+]
+REWARDS_NUMERIC_COLUMNS = ["cumulative_reward_points", "redeemed_points", "balance_points"]
+REWARDS_READ_OPTIONS = {"header": 4, "skiprows": [5]}
+
+DIRECTORY_TABLE = "student_directory"
+DIRECTORY_COLUMNS = ["email", "roll_no"]
+DIRECTORY_READ_OPTIONS = {"header": 0}
+
+
+def clean_column_name(col_name):
+    if not isinstance(col_name, str): return str(col_name)
+    name = col_name.lower()
+    name = name.replace('reedemed', 'redeemed')
+    name = re.sub(r'[\. ]+', '_', name)
+    name = name.strip('_')
+    return name
+
+
+# --- Validation ---
+# Each chunk is checked with vectorized pandas operations only. Instead of
+# being silently dropped, a bad row is written to a rejection report together
+# with every reason it failed. Duplicate keys are tracked across chunks, so the
+# first occurrence is imported and later ones are rejected.
+ROLL_NO_PATTERN = os.getenv("ROLL_NO_PATTERN", r"[A-Z0-9]{6,20}")
+EMAIL_PATTERN = r"[^@\s]+@[^@\s]+\.[^@\s]+"
+REJECTION_DIR = os.path.join("uploads", "rejections")
+
+
+def flag(reasons: pd.Series, mask: pd.Series, label: str) -> pd.Series:
+    return reasons.mask(mask.fillna(False).astype(bool), reasons + label + "; ")
+
+
+def normalized(series: pd.Series, case: str) -> pd.Series:
+    # "string" dtype: numbers or NaN in the column no longer break .str
+    text = series.astype("string").str.strip()
+    return text.str.upper() if case == "upper" else text.str.lower()
+
+
+def blank(series: pd.Series) -> pd.Series:
+    return series.isna() | (series == "")
+
+
+def check_key(reasons, values, pattern, name, seen: set):
+    missing = blank(values)
+    reasons = flag(reasons, missing, f"missing {name}")
+    reasons = flag(reasons, ~missing & ~values.str.fullmatch(pattern, na=False), f"malformed {name}")
+    # Only rows that are otherwise valid claim a key
+    candidate = reasons == ""
+    duplicate = candidate & (values.duplicated(keep="first") | values.isin(seen))
+    reasons = flag(reasons, duplicate, f"duplicate {name}")
+    seen.update(values[candidate & ~duplicate].tolist())
+    return reasons
+
+
+def validate_rewards_chunk(df: pd.DataFrame, seen: dict):
+    """Returns (valid rows, rejected raw rows, rejection reasons)."""
+    df = df.iloc[:, :10]
+    df.columns = [clean_column_name(col) for col in df.columns]
+    df = df.dropna(how="all")
+    raw = df.copy()
+    reasons = pd.Series("", index=df.index, dtype="object")
+    for col in REWARDS_NUMERIC_COLUMNS:
+        text = df[col].astype("string").str.replace(',', '', regex=False).str.strip()
+        # Accounting format: "(150.00)" is -150.00
+        text = text.str.replace(r"^\((.*)\)$", r"-\1", regex=True)
+        values = pd.to_numeric(text, errors='coerce')
+        reasons = flag(reasons, ~blank(text) & values.isna(), f"invalid {col}")
+        df[col] = values
+    df["sl_no"] = pd.to_numeric(df["sl_no"], errors='coerce').astype("Int64")
+    df["roll_no"] = normalized(df["roll_no"], "upper")
+    seen["file_keys"].update(df["roll_no"].dropna().tolist())
+    reasons = check_key(reasons, df["roll_no"], ROLL_NO_PATTERN, "roll_no", seen["roll_no"])
+    valid = reasons == ""
+    return df.loc[valid, REWARDS_COLUMNS], raw[~valid], reasons[~valid]
+
+
+def validate_directory_chunk(df: pd.DataFrame, seen: dict):
+    """Returns (valid rows, rejected raw rows, rejection reasons)."""
+    df = df.rename(columns={
+        'Mail id': 'email',
+        'Register No.': 'roll_no'
+    })
+    df = df[DIRECTORY_COLUMNS].dropna(how="all")
+    raw = df.copy()
+    reasons = pd.Series("", index=df.index, dtype="object")
+    df["email"] = normalized(df["email"], "lower")
+    df["roll_no"] = normalized(df["roll_no"], "upper")
+    seen["file_keys"].update(df["email"].dropna().tolist())
+    reasons = check_key(reasons, df["email"], EMAIL_PATTERN, "email", seen["email"])
+    # roll_no is UNIQUE too, so a roll number listed under two emails is rejected
+    reasons = check_key(reasons, df["roll_no"], ROLL_NO_PATTERN, "roll_no", seen["roll_no"])
+    valid = reasons == ""
+    return df.loc[valid, DIRECTORY_COLUMNS], raw[~valid], reasons[~valid]
+
+
+class RejectionReport:
+    """Rejected rows with their data row number and reasons, as a downloadable CSV."""
+    def __init__(self):
+        self.report_id = str(uuid.uuid4())
+        self.path = os.path.join(REJECTION_DIR, f"{self.report_id}.csv")
+        self.rejected = 0
+        self.reasons = {}
+
+    def add(self, raw: pd.DataFrame, reasons: pd.Series):
+        if raw.empty:
+            return
+        reasons = reasons.str.rstrip("; ")
+        report = raw.assign(row=raw.index + 1, reasons=reasons)
+        report = report[["row", "reasons", *raw.columns]]
+        os.makedirs(REJECTION_DIR, exist_ok=True)
+        report.to_csv(self.path, mode="a", index=False, header=self.rejected == 0)
+        self.rejected += len(report)
+        for reason, count in reasons.str.split("; ").explode().value_counts().items():
+            self.reasons[reason] = self.reasons.get(reason, 0) + int(count)
+
+    def summary(self) -> dict:
+        return {
+            "rejected": self.rejected,
+            "rejection_reasons": self.reasons,
+            "rejection_report_id": self.report_id if self.rejected else None,
+        }
+
+
+def rejection_report_path(report_id: str):
+    """Path of a stored report, or None for unknown (or malformed) ids."""
+    try:
+        report_id = str(uuid.UUID(report_id))
+    except ValueError:
+        return None
+    path = os.path.join(REJECTION_DIR, f"{report_id}.csv")
+    return path if os.path.exists(path) else None
+
+
+# --- Staging + merge ---
+def copy_chunk(curs, df: pd.DataFrame, columns):
+    buffer = io.StringIO()
+    # Missing values become empty unquoted fields, which COPY reads as NULL
+    df.to_csv(buffer, index=False, header=False)
+    buffer.seek(0)
+    curs.copy_expert(f"COPY import_staging ({', '.join(columns)}) FROM STDIN WITH (FORMAT csv)", buffer)
+
+
+def merge_staging(curs, table: str, columns, key: str) -> dict:
+    value_columns = [col for col in columns if col != key]
+    assignments = ", ".join(f"{col} = EXCLUDED.{col}" for col in value_columns)
+    current = ", ".join(f"{table}.{col}" for col in value_columns)
+    incoming = ", ".join(f"EXCLUDED.{col}" for col in value_columns)
+    column_list = ", ".join(columns)
+    curs.execute(f"SELECT COUNT(DISTINCT {key}) FROM import_staging")
+    staged = curs.fetchone()[0]
+    # xmax = 0 only for freshly inserted rows; unchanged rows are skipped by the WHERE
+    curs.execute(
+        f"""
+        WITH merged AS (
+            INSERT INTO {table} ({column_list})
+            SELECT DISTINCT ON ({key}) {column_list} FROM import_staging ORDER BY {key}
+            ON CONFLICT ({key}) DO UPDATE SET {assignments}
+            WHERE ({current}) IS DISTINCT FROM ({incoming})
+            RETURNING (xmax = 0) AS inserted
+        )
+        SELECT COUNT(*) FILTER (WHERE inserted), COUNT(*) FILTER (WHERE NOT inserted) FROM merged
+        """
+    )
+    inserted, updated = curs.fetchone()
+    return {"rows": staged, "inserted": inserted, "updated": updated, "unchanged": staged - inserted - updated}
+
+
+def import_csv(csv_path: str, table: str, columns, key: str, read_options: dict, validate_chunk,
+               chunk_rows: int = 5000, prune: bool = False, before_merge=None) -> dict:
+    """
+    Loads the valid rows of `csv_path` into `table` as described above. With
+    prune=True, rows whose key is not in the file at all (rejected rows
+    included) are deleted. Returns the merge counts and a summary of the
+    rejection report.
+    """
+    started = time.perf_counter()
+    seen = defaultdict(set)
+    report = RejectionReport()
+    conn = get_connection()
+    try:
+        with conn.cursor() as curs:
+            curs.execute(
+                f"CREATE TEMP TABLE import_staging (LIKE {table} INCLUDING DEFAULTS) ON COMMIT DROP"
+            )
+            for df in pd.read_csv(csv_path, chunksize=chunk_rows, dtype=str, **read_options):
+                valid, rejected, reasons = validate_chunk(df, seen)
+                report.add(rejected, reasons)
+                if not valid.empty:
+                    copy_chunk(curs, valid, columns)
+            if before_merge:
+                before_merge(curs)
+            counts = merge_staging(curs, table, columns, key)
+            if prune:
+                # Pruned against every key in the file, rejected rows included, so a
+                # row that fails validation this time keeps its existing record
+                file_keys = list(seen["file_keys"])
+                counts["deleted"] = 0
+                if file_keys:
+                    curs.execute(f"DELETE FROM {table} WHERE NOT ({key} = ANY(%s))", (file_keys,))
+                    counts["deleted"] = curs.rowcount
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_connection(conn)
+    counts.update(report.summary())
+    counts["seconds"] = round(time.perf_counter() - started, 3)
+    return counts
+
+
+def release_moved_roll_numbers(curs):
+    # A roll number that now belongs to a different email would violate
+    # roll_no UNIQUE during the merge; drop the old email's row first.
+    curs.execute(
+        f"""
+        DELETE FROM {DIRECTORY_TABLE} d USING import_staging s
+        WHERE d.roll_no = s.roll_no AND d.email <> s.email
+        """
+    )
+
+
+def import_rewards_csv(csv_path: str, chunk_rows: int = 5000, prune: bool = False) -> dict:
+    return import_csv(
+        csv_path, REWARDS_TABLE, REWARDS_COLUMNS, "roll_no", REWARDS_READ_OPTIONS,
+        validate_rewards_chunk, chunk_rows=chunk_rows, prune=prune
+    )
+
+
+def import_directory_csv(csv_path: str, chunk_rows: int = 5000, prune: bool = False) -> dict:
+    return import_csv(
+        csv_path, DIRECTORY_TABLE, DIRECTORY_COLUMNS, "email", DIRECTORY_READ_OPTIONS,
+        validate_directory_chunk, chunk_rows=chunk_rows, prune=prune, before_merge=release_moved_roll_numbers
+    )
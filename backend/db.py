@@ -0,0 +1,334 @@
+import os
+import time
+import asyncio
+import threading
+from contextlib import asynccontextmanager
+from psycopg2 import pool as psycopg2_pool
+import psycopg
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from sqlalchemy import create_engine, event
+from sqlalchemy.ext.asyncio import create_async_engine
+from dotenv import load_dotenv
+
+# --- Shared Database Layer ---
+# Every router borrows connections from here instead of calling
+# psycopg2.connect() per request:
+#   - get_connection()/release_connection(): psycopg2 pool for the sync routers
+#   - async_connection(): psycopg 3 async pool for the chatbot
+#   - get_sync_engine()/get_async_engine(): SQLAlchemy engines for PGVector and pandas
+# main.py opens everything at startup; the getters also open lazily so
+# standalone scripts keep working.
+load_dotenv()
+
+DB_URL_STANDARD = os.getenv("DB_URL_STANDARD")
+DB_URL_SQLALCHEMY = os.getenv("DB_URL_SQLALCHEMY")
+
+DB_POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+DB_POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+DB_ASYNC_POOL_MAX_SIZE = int(os.getenv("DB_ASYNC_POOL_MAX_SIZE", "10"))
+DB_ENGINE_POOL_SIZE = int(os.getenv("DB_ENGINE_POOL_SIZE", "5"))
+DB_ENGINE_MAX_OVERFLOW = int(os.getenv("DB_ENGINE_MAX_OVERFLOW", "5"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections idle longer than this are pinged before being handed out
+DB_POOL_CHECK_IDLE_SECONDS = float(os.getenv("DB_POOL_CHECK_IDLE_SECONDS", "30"))
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# --- Sync pool (psycopg2) ---
+class SyncConnectionPool:
+    """
+    psycopg2's ThreadedConnectionPool raises as soon as it is exhausted; this
+    wrapper makes callers wait (up to DB_POOL_TIMEOUT) instead, pings idle
+    connections before reuse, and records how long callers waited.
+    getconn() blocks, so routes using this pool are plain `def` (FastAPI runs
+    them in its threadpool) or borrow through run_in_threadpool.
+    """
+    def __init__(self, dsn: str, min_size: int, max_size: int):
+        self._pool = psycopg2_pool.ThreadedConnectionPool(min_size, max_size, dsn)
+        self._slots = threading.BoundedSemaphore(max_size)
+        self._last_used = {}
+        self._lock = threading.Lock()
+        self.max_size = max_size
+        self.in_use = 0
+        self.acquired = 0
+        self.timeouts = 0
+        self.health_check_failures = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    def getconn(self):
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=DB_POOL_TIMEOUT):
+            with self._lock:
+                self.timeouts += 1
+            raise PoolTimeout(f"No database connection available after {DB_POOL_TIMEOUT}s")
+        try:
+            conn = self._checked_conn()
+        except Exception:
+            self._slots.release()
+            raise
+        waited = time.perf_counter() - started
+        with self._lock:
+            self.in_use += 1
+            self.acquired += 1
+            self.total_wait_seconds += waited
+            self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        return conn
+
+    def _checked_conn(self):
+        conn = self._pool.getconn()
+        idle_for = time.monotonic() - self._last_used.get(id(conn), 0)
+        if conn.closed or idle_for > DB_POOL_CHECK_IDLE_SECONDS:
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("SELECT 1")
+                conn.rollback()
+            except Exception:
+                with self._lock:
+                    self.health_check_failures += 1
+                self._pool.putconn(conn, close=True)
+                conn = self._pool.getconn()
+        return conn
+
+    def putconn(self, conn):
+        try:
+            self._last_used[id(conn)] = time.monotonic()
+            self._pool.putconn(conn, close=bool(conn.closed))
+        finally:
+            with self._lock:
+                self.in_use -= 1
+            self._slots.release()
+
+    def close(self):
+        self._pool.closeall()
+
+    def stats(self) -> dict:
+        return {
+            "max_size": self.max_size,
+            "in_use": self.in_use,
+            "acquired": self.acquired,
+            "timeouts": self.timeouts,
+            "health_check_failures": self.health_check_failures,
+            "avg_wait_ms": round(1000 * self.total_wait_seconds / self.acquired, 2) if self.acquired else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait_seconds, 2),
+        }
+
+
+_sync_pool = None
+_sync_pool_lock = threading.Lock()
+
+def get_sync_pool() -> SyncConnectionPool:
+    global _sync_pool
+    if _sync_pool is None:
+        with _sync_pool_lock:
+            if _sync_pool is None:
+                _sync_pool = SyncConnectionPool(DB_URL_STANDARD, DB_POOL_MIN_SIZE, DB_POOL_MAX_SIZE)
+    return _sync_pool
+
+def get_connection():
+    """Borrows a psycopg2 connection. Always hand it back with release_connection()."""
+    return get_sync_pool().getconn()
+
+def release_connection(conn):
+    get_sync_pool().putconn(conn)
+
+
+# --- Async pool (psycopg 3) ---
+_async_pool = None
+_async_pool_lock = None
+
+async def get_async_pool() -> AsyncConnectionPool:
+    global _async_pool, _async_pool_lock
+    if _async_pool is None:
+        if _async_pool_lock is None:
+            _async_pool_lock = asyncio.Lock()
+        async with _async_pool_lock:
+            if _async_pool is None:
+                pool = AsyncConnectionPool(
+                    DB_URL_STANDARD,
+                    min_size=DB_POOL_MIN_SIZE,
+                    max_size=DB_ASYNC_POOL_MAX_SIZE,
+                    timeout=DB_POOL_TIMEOUT,
+                    kwargs={"row_factory": dict_row},
+                    check=AsyncConnectionPool.check_connection,
+                    open=False,
+                )
+                await pool.open()
+                _async_pool = pool
+    return _async_pool
+
+@asynccontextmanager
+async def async_connection():
+    """
+    Borrows an async connection (dict rows). Commits on a clean exit and
+    rolls back on an exception, like psycopg_pool's connection().
+    """
+    pool = await get_async_pool()
+    async with pool.connection() as conn:
+        yield conn
+
+
+# --- Vector search settings (pgvector ANN indexes, see vector_index.py) ---
+# hnsw.ef_search / ivfflat.probes trade recall for speed. The admin's values
+# live in the vector_search_settings table (init_db.py), so every worker uses
+# them and they survive restarts; unset ones fall back to these defaults.
+#   - queries on the psycopg pools (hybrid_search.py) run
+#     vector_search_settings_sql(), which reads the table in their transaction
+#   - engine connections get session SETs on checkout from this process's
+#     copy below, which listen_for_vector_search_settings() reloads whenever a
+#     change is NOTIFYed on VECTOR_SEARCH_CHANNEL
+VECTOR_SEARCH_DEFAULTS = {
+    "hnsw.ef_search": int(os.getenv("VECTOR_HNSW_EF_SEARCH", "40")),
+    "ivfflat.probes": int(os.getenv("VECTOR_IVFFLAT_PROBES", "10")),
+}
+VECTOR_SEARCH_CHANNEL = "vector_search_settings_changed"
+VECTOR_SEARCH_SETTINGS_QUERY = "SELECT name, value FROM vector_search_settings"
+vector_search_settings = dict(VECTOR_SEARCH_DEFAULTS)
+
+def _use_stored_settings(stored: dict):
+    vector_search_settings.update({
+        name: int(stored.get(name, default)) for name, default in VECTOR_SEARCH_DEFAULTS.items()
+    })
+    return dict(vector_search_settings)
+
+def load_vector_search_settings(conn) -> dict:
+    """Reloads this process's copy from the table (psycopg2 connection)."""
+    with conn.cursor() as curs:
+        curs.execute(VECTOR_SEARCH_SETTINGS_QUERY)
+        stored = dict(curs.fetchall())
+    conn.rollback()
+    return _use_stored_settings(stored)
+
+def save_vector_search_settings(conn, **settings) -> dict:
+    """Stores the given settings (None = unchanged) and notifies every worker."""
+    with conn.cursor() as curs:
+        for name, value in settings.items():
+            if value is None:
+                continue
+            curs.execute(
+                """
+                INSERT INTO vector_search_settings (name, value) VALUES (%s, %s)
+                ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW()
+                """,
+                (name, int(value))
+            )
+        curs.execute("SELECT pg_notify(%s, '')", (VECTOR_SEARCH_CHANNEL,))
+    conn.commit()
+    return load_vector_search_settings(conn)
+
+def vector_search_settings_sql() -> str:
+    """
+    Applies the stored settings to the running transaction only (SET LOCAL),
+    for raw pool connections that the checkout hook never sees. Returns one
+    (name, value) row per setting.
+    """
+    defaults = ", ".join(f"('{name}', {int(value)})" for name, value in VECTOR_SEARCH_DEFAULTS.items())
+    return f"""
+        SELECT d.name, set_config(d.name, coalesce(s.value, d.value)::text, true) AS value
+        FROM (VALUES {defaults}) AS d(name, value)
+        LEFT JOIN vector_search_settings s USING (name)
+    """
+
+async def reload_vector_search_settings() -> dict:
+    async with async_connection() as conn:
+        rows = await (await conn.execute(VECTOR_SEARCH_SETTINGS_QUERY)).fetchall()
+    return _use_stored_settings({row["name"]: row["value"] for row in rows})
+
+async def listen_for_vector_search_settings():
+    """Long-running task (started from main.py) that keeps this process's copy current."""
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(DB_URL_STANDARD, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {VECTOR_SEARCH_CHANNEL}")
+                # Also picks up changes made while this listener was disconnected
+                await reload_vector_search_settings()
+                async for _ in conn.notifies():
+                    await reload_vector_search_settings()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Vector search settings listener disconnected: {e}")
+            await asyncio.sleep(5)
+
+def _apply_vector_search_settings(dbapi_connection, connection_record, connection_proxy):
+    current = dict(vector_search_settings)
+    if connection_record.info.get("vector_search_settings") == current:
+        return
+    cursor = dbapi_connection.cursor()
+    try:
+        for name, value in current.items():
+            cursor.execute(f"SET {name} = {int(value)}")
+    finally:
+        cursor.close()
+    # The driver opens a transaction for the SETs; commit so a later rollback keeps them
+    dbapi_connection.commit()
+    connection_record.info["vector_search_settings"] = current
+
+
+# --- SQLAlchemy engines (PGVector, pandas) ---
+_sync_engine = None
+_async_engine = None
+
+def get_sync_engine():
+    global _sync_engine
+    if _sync_engine is None:
+        _sync_engine = create_engine(
+            DB_URL_SQLALCHEMY,
+            pool_size=DB_ENGINE_POOL_SIZE,
+            max_overflow=DB_ENGINE_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+        event.listen(_sync_engine, "checkout", _apply_vector_search_settings)
+    return _sync_engine
+
+def get_async_engine():
+    global _async_engine
+    if _async_engine is None:
+        _async_engine = create_async_engine(
+            DB_URL_SQLALCHEMY,
+            pool_size=DB_ENGINE_POOL_SIZE,
+            max_overflow=DB_ENGINE_MAX_OVERFLOW,
+            pool_timeout=DB_POOL_TIMEOUT,
+            pool_pre_ping=True,
+        )
+        event.listen(_async_engine.sync_engine, "checkout", _apply_vector_search_settings)
+    return _async_engine
+
+
+# --- Lifecycle (called from main.py) ---
+async def open_pools():
+    get_sync_pool()
+    await get_async_pool()
+
+async def close_pools():
+    global _sync_pool, _async_pool
+    if _async_pool is not None:
+        await _async_pool.close()
+        _async_pool = None
+    if _sync_pool is not None:
+        _sync_pool.close()
+        _sync_pool = None
+    # The engines stay referenced by the PGVector stores; just drop their connections
+    if _async_engine is not None:
+        await _async_engine.dispose()
+    if _sync_engine is not None:
+        _sync_engine.dispose()
+
+
+def pool_stats() -> dict:
+    stats = {}
+    if _sync_pool is not None:
+        stats["sync_pool"] = _sync_pool.stats()
+    if _async_pool is not None:
+        # requests_waiting / requests_wait_ms / requests_errors come from psycopg_pool
+        stats["async_pool"] = _async_pool.get_stats()
+    if _sync_engine is not None:
+        stats["sync_engine"] = _sync_engine.pool.status()
+    if _async_engine is not None:
+        stats["async_engine"] = _async_engine.pool.status()
+    return stats
@@ -1,11 +1,11 @@
 import os
-import psycopg2
 import smtplib # For sending email
 from email.message import EmailMessage
 from psycopg2.extras import RealDictCursor
 from fastapi import APIRouter, HTTPException, Depends, Body
 from pydantic import BaseModel
 from dotenv import load_dotenv
+from db import get_connection, release_connection
 from auth_routes import get_current_user_payload
 
 load_dotenv()
@@ -19,7 +19,7 @@ EMAIL_PASSWORD = os.getenv("EMAIL_PASSWORD")
 DB_URL = os.getenv("DB_URL_STANDARD")
 def get_db_connection():
     try:
-        return psycopg2.connect(DB_URL)
+        return get_connection()
     except Exception as e:
         print(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection error.")
@@ -52,7 +52,7 @@ class ResolveTicketRequest(BaseModel):
 
 # --- Department Endpoints ---
 @router.get("/department/tickets")
-async def get_department_tickets(payload: dict = Depends(get_current_user_payload)):
+def get_department_tickets(payload: dict = Depends(get_current_user_payload)):
     """
     Fetches all tickets for the logged-in department's role.
     """
@@ -95,10 +95,10 @@ async def get_department_tickets(payload: dict = Depends(get_current_user_payloa
         print(f"Error fetching tickets: {e}")
         raise HTTPException(status_code=500, detail="Failed to fetch tickets.")
     finally:
-        if conn: conn.close()
+        if conn: release_connection(conn)
 
 @router.post("/department/resolve")
-async def resolve_ticket(
+def resolve_ticket(
     request: ResolveTicketRequest,
     payload: dict = Depends(get_current_user_payload)
 ):
@@ -171,4 +171,4 @@ async def resolve_ticket(
         print(f"Error resolving ticket: {e}")
         raise HTTPException(status_code=500, detail="Failed to resolve ticket.")
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: release_connection(conn)
\ No newline at end of file
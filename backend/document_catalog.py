@@ -0,0 +1,68 @@
+import hashlib
+from psycopg2.extras import RealDictCursor
+
+# --- Document Catalog (documents table) ---
+# One row per ingested PDF, kept up to date by the ingest job, the delete
+# endpoint and delete_collection. /ingest/list/ reads this table instead of
+# scanning every row of langchain_pg_embedding for distinct sources.
+
+# Lets deletes and re-ingestion diffs find a source's chunks by index.
+# Created by init_db.py; registry.py runs it only if it is missing.
+SOURCE_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_langchain_pg_embedding_source
+    ON langchain_pg_embedding (collection_id, (cmetadata->>'source'))
+"""
+
+
+def file_sha256(file_path: str, block_size: int = 1024 * 1024) -> str:
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for block in iter(lambda: f.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def get_document(conn, source: str):
+    with conn.cursor(cursor_factory=RealDictCursor) as curs:
+        curs.execute("SELECT * FROM documents WHERE source = %s", (source,))
+        return curs.fetchone()
+
+
+def upsert_document(conn, source: str, page_count: int, chunk_count: int, content_hash: str, uploaded_by: str):
+    with conn.cursor() as curs:
+        curs.execute(
+            """
+            INSERT INTO documents (source, page_count, chunk_count, content_hash, uploaded_by)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (source) DO UPDATE SET
+                page_count = EXCLUDED.page_count,
+                chunk_count = EXCLUDED.chunk_count,
+                content_hash = EXCLUDED.content_hash,
+                uploaded_by = EXCLUDED.uploaded_by,
+                uploaded_at = NOW()
+            """,
+            (source, page_count, chunk_count, content_hash, uploaded_by)
+        )
+    conn.commit()
+
+
+def list_documents(conn):
+    with conn.cursor(cursor_factory=RealDictCursor) as curs:
+        curs.execute(
+            """
+            SELECT source, page_count, chunk_count, content_hash, uploaded_at, uploaded_by
+            FROM documents ORDER BY source
+            """
+        )
+        return curs.fetchall()
+
+
+def delete_document_entry(curs, source: str):
+    """Runs on the caller's cursor so it commits together with the chunk delete."""
+    curs.execute("DELETE FROM documents WHERE source = %s", (source,))
+
+
+def clear_documents(conn):
+    with conn.cursor() as curs:
+        curs.execute("DELETE FROM documents")
+    conn.commit()
@@ -0,0 +1,92 @@
+import os
+import asyncio
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Optional
+from langchain_core.embeddings import Embeddings
+from embedding_engines import EMBEDDING_ENGINE, build_embeddings
+
+# --- Query Embedding Cache ---
+# Questions repeat a lot ("hostel timings", "exam dates"), so query vectors are
+# kept in a bounded LRU cache. Document embedding (ingestion) is passed
+# straight through and never cached. The model itself is loaded on the first
+# embedding call, so importing the routers stays cheap.
+QUERY_EMBEDDING_CACHE_SIZE = int(os.getenv("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+# Sentences per forward pass when embedding document chunks
+EMBEDDING_BATCH_SIZE = int(os.getenv("EMBEDDING_BATCH_SIZE", "64"))
+
+
+class CachedQueryEmbeddings(Embeddings):
+    def __init__(self, load_base: Callable[[], Embeddings], max_size: int = QUERY_EMBEDDING_CACHE_SIZE):
+        self._load_base = load_base
+        self._base = None
+        self._base_lock = threading.Lock()
+        self.max_size = max_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def base(self) -> Embeddings:
+        if self._base is None:
+            with self._base_lock:
+                if self._base is None:
+                    self._base = self._load_base()
+        return self._base
+
+    @property
+    def loaded(self) -> bool:
+        return self._base is not None
+
+    def _get(self, text: str) -> Optional[List[float]]:
+        with self._lock:
+            vector = self._cache.get(text)
+            if vector is None:
+                return None
+            self._cache.move_to_end(text)
+            self.hits += 1
+            return list(vector)
+
+    def _put(self, text: str, vector: List[float]):
+        with self._lock:
+            self.misses += 1
+            self._cache[text] = tuple(vector)
+            self._cache.move_to_end(text)
+            while len(self._cache) > self.max_size:
+                self._cache.popitem(last=False)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.base.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        vector = self._get(text)
+        if vector is None:
+            vector = self.base.embed_query(text)
+            self._put(text, vector)
+        return vector
+
+    async def aembed_query(self, text: str) -> List[float]:
+        vector = self._get(text)
+        if vector is not None:
+            return vector
+        # The model is CPU-bound; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(None, self.embed_query, text)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "loaded": self.loaded,
+            "size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_shared_embeddings() -> CachedQueryEmbeddings:
+    """One all-MiniLM-L6-v2 instance (and one query cache) per process."""
+    return CachedQueryEmbeddings(lambda: build_embeddings(EMBEDDING_ENGINE, EMBEDDING_BATCH_SIZE))
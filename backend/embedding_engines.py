@@ -0,0 +1,53 @@
+import os
+import logging
+from langchain_huggingface import HuggingFaceEmbeddings
+
+logger = logging.getLogger(__name__)
+
+# --- Embedding Engines ---
+# all-MiniLM-L6-v2 can run on one of several CPU backends. They all load the
+# same weights and return 384-dim vectors, so existing collections keep
+# working whichever engine a deployment picks (benchmark_embeddings.py
+# measures the speed-up and the cosine drift against "torch"):
+#   torch      - plain PyTorch (the original setup)
+#   onnx       - ONNX Runtime on the exported fp32 graph
+#   onnx-int8  - ONNX Runtime on a dynamically quantized int8 graph
+# The ONNX engines need the optional `pip install -r requirements-onnx.txt`;
+# without it the app falls back to torch (the benchmark does not).
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+EMBEDDING_ENGINE = os.getenv("EMBEDDING_ENGINE", "torch").lower()
+# Quantized graphs shipped in the model repo; pick the one matching the CPU
+# (model_qint8_avx512_vnni.onnx, model_qint8_arm64.onnx, ...)
+EMBEDDING_ONNX_INT8_FILE = os.getenv("EMBEDDING_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+ENGINE_MODEL_KWARGS = {
+    "torch": {"device": "cpu"},
+    "onnx": {"device": "cpu", "backend": "onnx"},
+    "onnx-int8": {
+        "device": "cpu",
+        "backend": "onnx",
+        "model_kwargs": {"file_name": EMBEDDING_ONNX_INT8_FILE},
+    },
+}
+
+
+def build_embeddings(engine: str = EMBEDDING_ENGINE, batch_size: int = 64,
+                     fallback: bool = True) -> HuggingFaceEmbeddings:
+    """all-MiniLM-L6-v2 on the requested engine. With fallback=False an unavailable engine raises."""
+    if engine not in ENGINE_MODEL_KWARGS:
+        raise ValueError(f"Unknown EMBEDDING_ENGINE '{engine}'. Use one of {list(ENGINE_MODEL_KWARGS)}.")
+    try:
+        embeddings = HuggingFaceEmbeddings(
+            model_name=EMBEDDING_MODEL_NAME,
+            model_kwargs=ENGINE_MODEL_KWARGS[engine],
+            encode_kwargs={"batch_size": batch_size},
+        )
+    except Exception as e:
+        # sentence-transformers raises a plain Exception when optimum/onnxruntime
+        # are missing (and a TypeError before 3.2, which has no `backend`)
+        if engine == "torch" or not fallback:
+            raise
+        logger.warning(f"⚠️ Embedding engine '{engine}' unavailable ({e}); falling back to torch")
+        return build_embeddings("torch", batch_size)
+    logger.info(f"🧮 Embedding engine: {engine}")
+    return embeddings
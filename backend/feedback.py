@@ -1,10 +1,10 @@
 import os
-import psycopg2
 from psycopg2.extras import RealDictCursor
 from fastapi import APIRouter, HTTPException, Depends
 from pydantic import BaseModel
 from dotenv import load_dotenv
 from twilio.rest import Client
+from db import get_connection, release_connection
 from auth_routes import get_current_user_id
 
 # (Your imports...)
@@ -21,7 +21,7 @@ class FeedbackRequest(BaseModel):
 # --- (Copied helper functions: get_db_connection, get_username_from_db, send_sms) ---
 def get_db_connection():
     try:
-        return psycopg2.connect(DB_URL)
+        return get_connection()
     except Exception as e:
         print(f"Database connection error: {e}")
         raise HTTPException(status_code=500, detail="Database connection error.")
@@ -41,7 +41,7 @@ def get_username_from_db(user_id: str) -> str:
         print(f"⚠️ Failed to fetch username: {e}")
         return "Unknown User"
     finally:
-        if conn: conn.close()
+        if conn: release_connection(conn)
 
 def send_sms(to_number: str, message: str):
     try:
@@ -55,7 +55,7 @@ def send_sms(to_number: str, message: str):
 
 
 @router.post("/feedback")
-async def send_feedback(request: FeedbackRequest, user_id: str = Depends(get_current_user_id)):
+def send_feedback(request: FeedbackRequest, user_id: str = Depends(get_current_user_id)):
     query = request.question.strip()
     if not query:
         raise HTTPException(status_code=400, detail="Feedback message cannot be empty")
@@ -110,4 +110,4 @@ async def send_feedback(request: FeedbackRequest, user_id: str = Depends(get_cur
         print(f"❌ Error saving feedback to DB: {e}")
         raise HTTPException(status_code=500, detail="Error submitting feedback.")
     finally:
-        if conn: conn.close()
\ No newline at end of file
+        if conn: release_connection(conn)
\ No newline at end of file
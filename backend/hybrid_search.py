@@ -0,0 +1,178 @@
+import os
+import re
+import logging
+from typing import List, Optional, Tuple
+from psycopg2.extras import RealDictCursor
+from langchain_core.documents import Document
+from answer_cache import to_pgvector
+from db import async_connection, vector_search_settings_sql
+
+logger = logging.getLogger(__name__)
+
+# --- Hybrid Retrieval (full-text + vector) ---
+# MiniLM embeddings blur exact identifiers ("22CS101", "CS3451"), so chunks
+# also carry a generated tsvector column with a GIN index. The lexical query
+# requires every term of the question (stop words are dropped by to_tsquery),
+# so the GIN index returns a small candidate set.
+#   - If the question contains identifier-like tokens (letters and digits
+#     mixed), the lexical query requires all of them, and chunks matching it
+#     are kept whatever their distance. When it returns at least k chunks,
+#     they are ranked by distance and no collection-wide vector search runs.
+#   - Otherwise the top lexical matches and the top vector matches are fused
+#     with reciprocal rank fusion (RRF), and RAG_MAX_DISTANCE applies.
+# Plain numbers ("2025", "45") and ordinals ("3rd") are ordinary terms: they
+# narrow the lexical match but never bypass the vector search or the cut-off.
+# Results are [(doc, cosine distance)], like PGVector's *_with_score methods.
+HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "20"))
+RRF_K = int(os.getenv("HYBRID_RRF_K", "60"))
+TEXT_SEARCH_CONFIG = "english"
+
+# Created by init_db.py; registry.py runs these only if they are missing
+TSV_COLUMN_SQL = f"""
+    ALTER TABLE langchain_pg_embedding ADD COLUMN IF NOT EXISTS document_tsv tsvector
+    GENERATED ALWAYS AS (to_tsvector('{TEXT_SEARCH_CONFIG}', coalesce(document, ''))) STORED
+"""
+TSV_INDEX_SQL = """
+    CREATE INDEX IF NOT EXISTS idx_langchain_pg_embedding_tsv
+    ON langchain_pg_embedding USING gin (document_tsv)
+"""
+
+LEXICAL_SQL = f"""
+    SELECT id, document, cmetadata, embedding <=> %(vector)s::vector AS distance
+    FROM langchain_pg_embedding, to_tsquery('{TEXT_SEARCH_CONFIG}', %(tsquery)s) AS query
+    WHERE collection_id = %(collection_id)s AND document_tsv @@ query
+    ORDER BY ts_rank_cd(document_tsv, query, 32) DESC
+    LIMIT %(limit)s
+"""
+# Ordered by the distance expression itself so an ANN index can serve it
+VECTOR_SQL = """
+    SELECT id, document, cmetadata, embedding <=> %(vector)s::vector AS distance
+    FROM langchain_pg_embedding
+    WHERE collection_id = %(collection_id)s
+    ORDER BY embedding <=> %(vector)s::vector
+    LIMIT %(limit)s
+"""
+# The uuid is passed as a parameter (not a subquery) so a partial ANN index
+# built by vector_index.py matches the WHERE clause
+COLLECTION_SQL = "SELECT uuid FROM langchain_pg_collection WHERE name = %s"
+
+
+# --- Query planning ---
+def query_terms(question: str) -> List[str]:
+    # Alphanumeric tokens only, so the tsquery built from them is always valid
+    return [token.lower() for token in re.findall(r"[A-Za-z0-9]+", question)]
+
+
+ORDINAL = re.compile(r"\d+(st|nd|rd|th)")
+
+
+def code_terms(terms: List[str]) -> List[str]:
+    """Mixed letter+digit identifiers such as roll numbers and course codes."""
+    return [
+        term for term in terms
+        if len(term) >= 4 and any(c.isdigit() for c in term) and any(c.isalpha() for c in term)
+        and not ORDINAL.fullmatch(term)
+    ]
+
+
+def plan_lexical_query(question: str) -> Tuple[Optional[str], bool]:
+    """Returns (tsquery text, exact) where exact means 'all identifiers must match'."""
+    terms = query_terms(question)
+    codes = code_terms(terms)
+    if codes:
+        return " & ".join(dict.fromkeys(codes)), True
+    if terms:
+        # AND, not OR: an OR of every word matches (and ranks) most chunks
+        return " & ".join(dict.fromkeys(terms)), False
+    return None, False
+
+
+def needs_vector_search(lexical_rows, exact: bool, k: int) -> bool:
+    """False when enough chunks contain every identifier asked about."""
+    return not (exact and len(lexical_rows) >= k)
+
+
+# --- Fusion ---
+def rrf_fuse(*ranked_lists) -> List[dict]:
+    """Reciprocal rank fusion over lists of rows (dicts with an 'id')."""
+    scores, rows = {}, {}
+    for ranked in ranked_lists:
+        for rank, row in enumerate(ranked, start=1):
+            scores[row["id"]] = scores.get(row["id"], 0.0) + 1.0 / (RRF_K + rank)
+            rows.setdefault(row["id"], row)
+    return [rows[row_id] for row_id in sorted(scores, key=scores.get, reverse=True)]
+
+
+def to_results(rows: List[dict], k: int, max_distance: Optional[float], exempt=()) -> List[Tuple[Document, float]]:
+    results = []
+    for row in rows:
+        if max_distance is not None and row["distance"] > max_distance and row["id"] not in exempt:
+            continue
+        results.append((Document(page_content=row["document"], metadata=row["cmetadata"] or {}), float(row["distance"])))
+        if len(results) == k:
+            break
+    return results
+
+
+def fuse(lexical_rows, vector_rows, exact: bool, k: int, max_distance: Optional[float]):
+    # Chunks containing every identifier asked about are relevant even when
+    # their (prose-tuned) distance is above the cut-off
+    exempt = {row["id"] for row in lexical_rows} if exact else set()
+    if not needs_vector_search(lexical_rows, exact, k):
+        by_distance = sorted(lexical_rows, key=lambda row: row["distance"])
+        return to_results(by_distance, k, max_distance, exempt), "lexical"
+    mode = "hybrid+exact" if exempt else "hybrid"
+    return to_results(rrf_fuse(vector_rows, lexical_rows), k, max_distance, exempt), mode
+
+
+# --- Runners ---
+async def hybrid_search(collection_name: str, question: str, vector: List[float], k: int = 3,
+                        max_distance: Optional[float] = None) -> List[Tuple[Document, float]]:
+    """Async version (chatbot, psycopg 3 pool)."""
+    tsquery, exact = plan_lexical_query(question)
+    async with async_connection() as conn:
+        # Looked up per call (not cached): delete_collection recreates it under a new uuid
+        row = await (await conn.execute(COLLECTION_SQL, (collection_name,))).fetchone()
+        if not row:
+            return []
+        params = {"vector": to_pgvector(vector), "collection_id": row["uuid"], "limit": HYBRID_CANDIDATES}
+
+        # ef_search / probes for this transaction (PUT /ingest/vector_index/settings)
+        await conn.execute(vector_search_settings_sql())
+        lexical_rows = []
+        if tsquery:
+            lexical_rows = await (await conn.execute(LEXICAL_SQL, {**params, "tsquery": tsquery})).fetchall()
+        vector_rows = []
+        if needs_vector_search(lexical_rows, exact, k):
+            vector_rows = await (await conn.execute(VECTOR_SQL, params)).fetchall()
+    results, mode = fuse(lexical_rows, vector_rows, exact, k, max_distance)
+    logger.info(f"Hybrid search ({mode}): {len(lexical_rows)} lexical, {len(vector_rows)} vector candidates")
+    return results
+
+
+def hybrid_search_sync(conn, collection_name: str, question: str, vector: List[float], k: int = 5,
+                       max_distance: Optional[float] = None) -> List[Tuple[Document, float]]:
+    """Sync version for the psycopg2 routers."""
+    tsquery, exact = plan_lexical_query(question)
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as curs:
+            curs.execute(COLLECTION_SQL, (collection_name,))
+            row = curs.fetchone()
+            if not row:
+                return []
+            params = {"vector": to_pgvector(vector), "collection_id": row["uuid"], "limit": HYBRID_CANDIDATES}
+
+            curs.execute(vector_search_settings_sql())
+            lexical_rows = []
+            if tsquery:
+                curs.execute(LEXICAL_SQL, {**params, "tsquery": tsquery})
+                lexical_rows = curs.fetchall()
+            vector_rows = []
+            if needs_vector_search(lexical_rows, exact, k):
+                curs.execute(VECTOR_SQL, params)
+                vector_rows = curs.fetchall()
+    finally:
+        conn.rollback()
+    results, mode = fuse(lexical_rows, vector_rows, exact, k, max_distance)
+    logger.info(f"Hybrid search ({mode}): {len(lexical_rows)} lexical, {len(vector_rows)} vector candidates")
+    return results
@@ -1,82 +1,27 @@
-import pandas as pd
-from sqlalchemy import create_engine
 import sys
-import re # Import the regex module
+from csv_import import import_rewards_csv, REWARDS_TABLE
 
-# --- Your Database Configuration ---
-DB_USER = "postgres"
-DB_PASS = "343"
-DB_HOST = "localhost"
-DB_NAME = "BOT_DATA"
-TABLE_NAME = "student_rewards" # The table we created in Step 1
+# --- Standalone reward points import ---
+# Uses the same staging + merge import as /ingest/upload_rewards/ and the
+# database from .env (DB_URL_STANDARD), so running it never drops the table.
 CSV_FILE = "DEPARTMENT-WISE REWARD POINTS as on Tue Oct 28 2025 00_21_37 GMT+0530 (India Standard Time) - CSE.csv"
 
-# Construct the database connection URL
-DATABASE_URL = f"postgresql://{DB_USER}:{DB_PASS}@{DB_HOST}/{DB_NAME}"
-
-def clean_column_name(col_name):
-    """Cleans a single column name."""
-    if not isinstance(col_name, str):
-        return str(col_name)
-    # 1. Convert to lower case
-    name = col_name.lower()
-    # 2. Replace 'REEDEMED' with 'REDEEMED' specifically
-    name = name.replace('reedemed', 'redeemed')
-    # 3. Replace any non-alphanumeric characters (like '.', ' ') with an underscore
-    name = re.sub(r'[\. ]+', '_', name)
-    # 4. Remove any leading/trailing underscores
-    name = name.strip('_')
-    return name
-
 try:
-    # Connect to the database
-    engine = create_engine(DATABASE_URL)
-    print(f"Connecting to database '{DB_NAME}' at '{DB_HOST}'...")
-    
-    # 1. Load the CSV file
-    print(f"Reading CSV file: {CSV_FILE}...")
-    df = pd.read_csv(CSV_FILE, header=4, skiprows=[5])
-
-    # 2. Select only the first 10 columns that matter
-    df = df.iloc[:, :10]
-
-    # 3. Clean column names using our new function
-    df.columns = [clean_column_name(col) for col in df.columns]
-
-    # 4. Clean numeric data
-    # These names now match the cleaned column names
-    print("Cleaning data...")
-    cols_to_clean = ['cumulative_reward_points', 'redeemed_points', 'balance_points']
-    
-    for col in cols_to_clean:
-        if col not in df.columns:
-            print(f"Warning: Expected column '{col}' not found after cleaning. Skipping.")
-            continue
-            
-        # Remove commas, convert to float, handle errors
-        df[col] = df[col].astype(str).str.replace(',', '', regex=False)
-        df[col] = pd.to_numeric(df[col], errors='coerce')
-        
-    # Drop any rows where roll_no is missing, as it's the primary key
-    df = df.dropna(subset=['roll_no'])
-    
-    # Ensure all data is clean before insertion
-    df = df.fillna(pd.NA)
-
-    # 5. Import data into PostgreSQL
-    print(f"Importing {len(df)} records into table '{TABLE_NAME}'...")
-    # 'if_exists='replace'' will drop the table and recreate it.
-    df.to_sql(TABLE_NAME, engine, if_exists='replace', index=False)
-
-    print("\nSuccessfully imported data into the database!")
-    print(f"Check your '{TABLE_NAME}' table in the '{DB_NAME}' database.")
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else CSV_FILE
+    print(f"Importing CSV file: {csv_file}...")
+    counts = import_rewards_csv(csv_file)
+    print(f"\nSuccessfully imported {counts['rows']} records into '{REWARDS_TABLE}'!")
+    print(f"New: {counts['inserted']}, updated: {counts['updated']}, unchanged: {counts['unchanged']} ({counts['seconds']}s)")
+    if counts["rejected"]:
+        print(f"Rejected {counts['rejected']} rows: {counts['rejection_reasons']}")
+        print(f"See uploads/rejections/{counts['rejection_report_id']}.csv")
 
 except FileNotFoundError:
-    print(f"Error: The file '{CSV_FILE}' was not found.")
+    print(f"Error: The file '{csv_file}' was not found.")
     print("Please make sure the script is in the same directory as the CSV.")
 except ImportError:
     print("Error: Missing required libraries.")
-    print("Please run: pip install pandas sqlalchemy psycopg2-binary")
+    print("Please run: pip install -r requirements.txt")
 except Exception as e:
     print(f"An error occurred: {e}")
-    sys.exit(1)
\ No newline at end of file
+    sys.exit(1)
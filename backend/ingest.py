@@ -1,22 +1,38 @@
 import os
 import uuid
+import time
+import asyncio
 import logging
-import pandas as pd
-from sqlalchemy import create_engine, text
-import re
-import io
-import fitz      # For PyMuPDF
-import psycopg2
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from psycopg2.extras import RealDictCursor
 from fastapi import APIRouter, UploadFile, File, HTTPException, Depends
-from langchain_postgres import PGVector
-from langchain_huggingface import HuggingFaceEmbeddings
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import FileResponse
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 from langchain_core.documents import Document
 from dotenv import load_dotenv
 
 # --- IMPORT YOUR ADMIN SECURITY ---
 from auth_routes import get_current_admin_user
+from answer_cache import invalidate_answer_cache
+from embedding_cache import get_shared_embeddings
+from registry import COLLECTION_NAME_DOCS, get_docs_store
+from pdf_extract import read_pdf_info, extract_pages
+from upload_utils import save_upload, track_memory, MemoryReport, MAX_PDF_UPLOAD_MB, MAX_CSV_UPLOAD_MB, CSV_CHUNK_ROWS
+from document_catalog import (
+    file_sha256, get_document, upsert_document, delete_document_entry, clear_documents,
+    list_documents as list_catalog_documents
+)
+from csv_import import import_rewards_csv, import_directory_csv, rejection_report_path, REWARDS_TABLE, DIRECTORY_TABLE
+from hybrid_search import hybrid_search_sync
+from bulk_ingest import assign_chunk_ids, get_collection_id, diff_source_chunks, sync_source_chunks
+from db import get_connection, release_connection, save_vector_search_settings
+from vector_index import VectorIndexError, build_index, drop_index, index_status, check_recall
+from ingest_jobs import (
+    INGEST_STALE_SECONDS, IngestJobActive, create_job, find_active_job, claim_job, find_resumable_jobs,
+    update_job_progress, finish_job, get_job, list_jobs
+)
 
 # --- LOAD .ENV VARIABLES ---
 load_dotenv()
@@ -43,20 +59,11 @@ PSYCOPG2_DB_URL = os.getenv("DB_URL_STANDARD")
 if not DB_CONNECTION_STRING or not SQLALCHEMY_DB_URL or not PSYCOPG2_DB_URL:
     raise RuntimeError("Database connection strings not set in .env file. Please check your .env file.")
 
-COLLECTION_NAME = "New_embeddings" 
+COLLECTION_NAME = COLLECTION_NAME_DOCS
 
 # --- SETUP COMPONENTS ---
-embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-try:
-    VECTOR_DB = PGVector(
-        connection=DB_CONNECTION_STRING, # This now comes from .env
-        embeddings=embedding_model,
-        collection_name=COLLECTION_NAME,
-        pre_delete_collection=False,
-    )
-except Exception as e:
-    print(f"Error connecting to PGVector in ingest.py: {e}")
-    raise RuntimeError(e)
+# The PGVector store (and its per-source/full-text indexes) and the embedding
+# model are shared with the chatbot and created on first use (registry.py)
 
 # --- SETUP LOGGER ---
 logging.basicConfig(level=logging.INFO)
@@ -66,176 +73,379 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 # --- HELPERS ---
-def clean_column_name(col_name):
-    if not isinstance(col_name, str): return str(col_name)
-    name = col_name.lower()
-    name = name.replace('reedemed', 'redeemed')
-    name = re.sub(r'[\. ]+', '_', name)
-    name = name.strip('_')
-    return name
-
 def get_db_conn_psycopg2():
-    """Helper function to get a psycopg2 connection"""
+    """Helper function to borrow a pooled psycopg2 connection (see db.py)"""
     try:
-        return psycopg2.connect(PSYCOPG2_DB_URL) # This now comes from .env
+        return get_connection()
     except Exception as e:
         logger.error(f"Failed to connect with psycopg2: {e}")
         raise HTTPException(status_code=500, detail="Database connection error.")
 
+def refresh_answer_cache():
+    """Cached bot answers may quote documents that just changed, so drop them."""
+    conn = None
+    try:
+        conn = get_db_conn_psycopg2()
+        invalidate_answer_cache(conn)
+    except Exception as e:
+        logger.error(f"Failed to invalidate answer cache: {e}")
+    finally:
+        if conn:
+            release_connection(conn)
+
+# --- PDF INGESTION PIPELINE (runs in the ingest worker pool) ---
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", "256"))
+# "copy": batched embedding + COPY, committed batch by batch (bulk_ingest.py)
+# "langchain": PGVector.add_documents per batch
+INGEST_WRITE_MODE = os.getenv("INGEST_WRITE_MODE", "copy")
+ingest_executor = ThreadPoolExecutor(max_workers=INGEST_WORKERS, thread_name_prefix="ingest")
+# How often interrupted jobs are looked for (see sweep_ingest_jobs)
+INGEST_SWEEP_SECONDS = max(INGEST_STALE_SECONDS / 2, 1)
+
+def with_db(fn, *args, **kwargs):
+    """Runs one ingest_jobs helper on a pooled connection."""
+    conn = get_db_conn_psycopg2()
+    try:
+        return fn(conn, *args, **kwargs)
+    finally:
+        release_connection(conn)
+
+def extract_pdf_pages(file_path, filename, job_id):
+    doc_metadata, page_count = read_pdf_info(file_path)
+    with_db(update_job_progress, job_id, pages_total=page_count, document_metadata=doc_metadata)
+    # Large PDFs are sharded across worker processes (pdf_extract.py)
+    pages = extract_pages(
+        file_path, page_count,
+        on_progress=lambda pages_parsed: with_db(update_job_progress, job_id, pages_parsed=pages_parsed)
+    )
+    page_documents = []
+    for page_number, page_text in pages:
+        page_meta = {
+            "source": filename,
+            "page_number": page_number,
+            "doc_title": doc_metadata.get('title', 'N/A'),
+            "doc_author": doc_metadata.get('author', 'N/A'),
+            "doc_creation_date": doc_metadata.get('creationDate', 'N/A')
+        }
+        page_documents.append(
+            Document(page_content=page_text, metadata=page_meta)
+        )
+    return page_documents, page_count
+
+def split_pages(page_documents, source):
+    """Chunk ids come from the source and content hash, so unchanged chunks keep their id on re-upload."""
+    splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
+    final_chunks = splitter.split_documents(page_documents)
+    chunk_ids = assign_chunk_ids(final_chunks, source)
+    return final_chunks, chunk_ids
+
+def add_documents_in_batches(final_chunks, chunk_ids, source, on_progress):
+    """The original PGVector.add_documents path (INGEST_WRITE_MODE=langchain), kept for comparison."""
+    started = time.perf_counter()
+    conn = get_db_conn_psycopg2()
+    try:
+        collection_id = get_collection_id(conn, COLLECTION_NAME)
+        # Chunks stored by an interrupted attempt already count as kept
+        new_positions, kept_positions, removed_ids = diff_source_chunks(conn, collection_id, source, chunk_ids)
+    finally:
+        release_connection(conn)
+    new_chunks = [final_chunks[i] for i in new_positions]
+    new_ids = [chunk_ids[i] for i in new_positions]
+    for offset in range(0, len(new_chunks), INGEST_BATCH_SIZE):
+        batch = new_chunks[offset:offset + INGEST_BATCH_SIZE]
+        get_docs_store().add_documents(batch, ids=new_ids[offset:offset + INGEST_BATCH_SIZE])
+        on_progress(offset + len(batch))
+    if removed_ids:
+        get_docs_store().delete(ids=removed_ids)
+    total_seconds = time.perf_counter() - started
+    return {
+        "mode": "langchain",
+        "added": len(new_ids),
+        "kept": len(kept_positions),
+        "removed": len(removed_ids),
+        "total_seconds": round(total_seconds, 3),
+        "chunks_per_sec": round(len(new_ids) / total_seconds, 2) if total_seconds else 0.0,
+    }
+
+def process_ingest_job(job_id):
+    job = with_db(claim_job, job_id)
+    if not job:
+        return # Finished, or already being processed by another worker
+    filename = job["filename"]
+    memory = MemoryReport()
+    try:
+        file_hash = file_sha256(job["file_path"])
+        catalog_entry = with_db(get_document, filename)
+        if catalog_entry and catalog_entry["content_hash"] == file_hash:
+            # Byte-identical re-upload: every chunk is already stored
+            with_db(
+                update_job_progress, job_id,
+                chunks_total=catalog_entry["chunk_count"], chunks_added=0,
+                chunks_kept=catalog_entry["chunk_count"], chunks_removed=0
+            )
+            finish_ingest_job(job, "completed")
+            logger.info(f"Ingest job {job_id}: {filename} is unchanged, nothing to do")
+            return
+
+        page_documents, page_count = extract_pdf_pages(job["file_path"], filename, job_id)
+        if not page_documents:
+            raise ValueError("No readable text in PDF")
+        final_chunks, chunk_ids = split_pages(page_documents, filename)
+        with_db(
+            update_job_progress, job_id,
+            chunks_total=len(final_chunks), write_mode=INGEST_WRITE_MODE, **memory.snapshot()
+        )
+
+        # chunks_embedded counts new chunks only; unchanged ones are never re-embedded
+        report_progress = lambda embedded: with_db(update_job_progress, job_id, chunks_embedded=embedded)
+        # Creates the collection (and its indexes) if this is the first upload
+        get_docs_store()
+        if INGEST_WRITE_MODE == "copy":
+            report = sync_source_chunks(
+                final_chunks, chunk_ids, filename, COLLECTION_NAME, get_shared_embeddings(), INGEST_BATCH_SIZE,
+                report_progress
+            )
+        else:
+            report = add_documents_in_batches(final_chunks, chunk_ids, filename, report_progress)
+        with_db(
+            update_job_progress, job_id,
+            chunks_added=report["added"], chunks_kept=report["kept"], chunks_removed=report["removed"],
+            chunks_per_sec=report["chunks_per_sec"], **memory.snapshot()
+        )
+        logger.info(f"Ingest job {job_id} write report: {report}")
+        with_db(upsert_document, filename, page_count, len(final_chunks), file_hash, job["uploaded_by"])
+
+        if report["added"] or report["removed"]:
+            refresh_answer_cache()
+        finish_ingest_job(job, "completed")
+        logger.info(
+            f"Ingest job {job_id}: {filename} -> {report['added']} added, "
+            f"{report['kept']} kept, {report['removed']} removed"
+        )
+    except Exception as e:
+        logger.error(f"Ingest job {job_id} failed for {filename}: {e}")
+        finish_ingest_job(job, "failed", str(e))
+
+def finish_ingest_job(job, status, error=None):
+    """Finished jobs are never resumed, so their copy of the upload can go."""
+    with_db(finish_job, job["job_id"], status, error)
+    if os.path.exists(job["file_path"]):
+        os.remove(job["file_path"])
+
+# Jobs handed to ingest_executor by this process and not finished yet, so the
+# sweep does not queue them twice
+submitted_jobs = set()
+submitted_jobs_lock = threading.Lock()
+
+def submit_ingest_job(job_id):
+    with submitted_jobs_lock:
+        if job_id in submitted_jobs:
+            return False
+        submitted_jobs.add(job_id)
+    future = ingest_executor.submit(process_ingest_job, job_id)
+    future.add_done_callback(lambda _: discard_submitted_job(job_id))
+    return True
+
+def discard_submitted_job(job_id):
+    with submitted_jobs_lock:
+        submitted_jobs.discard(job_id)
+
+def resume_ingest_jobs():
+    """Re-queues jobs that were queued or interrupted by a crash (any worker's)."""
+    try:
+        job_ids = with_db(find_resumable_jobs)
+    except Exception as e:
+        logger.error(f"Could not look for interrupted ingest jobs: {e}")
+        return
+    for job_id in job_ids:
+        if submit_ingest_job(job_id):
+            logger.info(f"Resuming ingest job {job_id}")
+
+async def sweep_ingest_jobs():
+    """
+    Background task (main.py). A crashed worker's job only becomes resumable
+    INGEST_STALE_SECONDS after its last heartbeat, which is usually after the
+    restarted worker has already run its startup check, so the check repeats.
+    """
+    while True:
+        await run_in_threadpool(resume_ingest_jobs)
+        await asyncio.sleep(INGEST_SWEEP_SECONDS)
+
+async def save_csv_upload(file: UploadFile) -> str:
+    """Streams a CSV upload to a temporary file so pandas can read it in chunks."""
+    os.makedirs("uploads", exist_ok=True)
+    csv_path = os.path.join("uploads", f"{uuid.uuid4()}.csv")
+    await save_upload(file, csv_path, MAX_CSV_UPLOAD_MB)
+    return csv_path
+
 # --- ROUTES (NOW SECURED) ---
-@router.post("/upload/")
+@router.post("/upload/", status_code=202)
 async def upload_file(
     file: UploadFile = File(...),
     admin_id: str = Depends(get_current_admin_user)
 ):
-    """(This is your existing PDF upload endpoint)"""
+    """Saves the PDF and queues it for ingestion. Poll /ingest/jobs/{job_id} for progress."""
     if file.content_type != 'application/pdf':
         raise HTTPException(status_code=400, detail="Invalid file type. Only PDFs are allowed.")
     
+    file_path, queued = None, False
     try:
+        active_job_id = await run_in_threadpool(with_db, find_active_job, file.filename)
+        if active_job_id:
+            raise IngestJobActive(f"An ingest job for {file.filename} is already queued or running.")
         os.makedirs("uploads", exist_ok=True)
-        file_path = os.path.join("uploads", file.filename)
-        with open(file_path, "wb") as f:
-            f.write(await file.read())
-        page_documents = []
-        doc_metadata = {}
-        try:
-            with fitz.open(file_path) as doc:
-                doc_metadata = doc.metadata
-                for page_num, page in enumerate(doc.pages()):
-                    page_text = page.get_text()
-                    if page_text.strip(): 
-                        page_meta = {
-                            "source": file.filename,
-                            "page_number": page_num + 1,
-                            "doc_title": doc_metadata.get('title', 'N/A'),
-                            "doc_author": doc_metadata.get('author', 'N/A'),
-                            "doc_creation_date": doc_metadata.get('creationDate', 'N/A')
-                        }
-                        page_documents.append(
-                            Document(page_content=page_text, metadata=page_meta)
-                        )
-        except Exception as e:
-            logger.error(f"Failed to process PDF {file.filename}: {e}")
-            raise HTTPException(status_code=400, detail=f"Failed to process PDF: {e}")
-        if not page_documents:
-            raise HTTPException(status_code=400, detail="No readable text in PDF")
-        splitter = RecursiveCharacterTextSplitter(chunk_size=1000, chunk_overlap=100)
-        final_chunks = splitter.split_documents(page_documents)
-        for chunk in final_chunks:
-            chunk.metadata["chunk_id"] = str(uuid.uuid4())
-        if final_chunks:
-            VECTOR_DB.add_documents(final_chunks)
+        job_id = str(uuid.uuid4())
+        # Streamed to a file of its own; the ingest job opens the PDF from this
+        # path, so a later upload of the same name never changes it under the job
+        file_path = os.path.join("uploads", f"{job_id}.pdf")
+        size = await save_upload(file, file_path, MAX_PDF_UPLOAD_MB)
+        await run_in_threadpool(with_db, create_job, job_id, file.filename, file_path, admin_id)
+        queued = True
+        submit_ingest_job(job_id)
         return {
-            "message": f"Uploaded {len(final_chunks)} chunks from {file.filename}",
-            "document_metadata": doc_metadata
+            "message": f"Upload of {file.filename} accepted. Processing in the background.",
+            "job_id": job_id,
+            "status_url": f"/ingest/jobs/{job_id}",
+            "size_bytes": size
         }
+    except IngestJobActive as e:
+        raise HTTPException(status_code=409, detail=f"{e} Wait for it to finish, then upload again.")
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Upload error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        # Kept only if a job was created for it; the job removes it when done
+        if not queued and file_path and os.path.exists(file_path):
+            os.remove(file_path)
+
+@router.get("/jobs/")
+def list_ingest_jobs(admin_id: str = Depends(get_current_admin_user)):
+    try:
+        return {"jobs": with_db(list_jobs)}
+    except Exception as e:
+        logger.error(f"Failed to list ingest jobs: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/jobs/{job_id}")
+def get_ingest_job(job_id: str, admin_id: str = Depends(get_current_admin_user)):
+    try:
+        job = with_db(get_job, job_id)
+    except Exception as e:
+        logger.error(f"Failed to fetch ingest job {job_id}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not job:
+        raise HTTPException(status_code=404, detail="Ingest job not found.")
+    return job
 
 @router.post("/upload_rewards/")
 async def upload_rewards(
     file: UploadFile = File(...),
+    prune: bool = False,
     admin_id: str = Depends(get_current_admin_user)
 ):
-    """(This is your new CSV upload endpoint)"""
+    """Upserts reward points by roll_no. prune=true also deletes students missing from the file."""
     if file.content_type != 'text/csv':
         raise HTTPException(status_code=400, detail="Invalid file type. Only CSVs are allowed.")
-    TABLE_NAME = "student_rewards"
+    TABLE_NAME = REWARDS_TABLE
+    csv_path = None
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents), header=4, skiprows=[5])
-        df = df.iloc[:, :10]
-        df.columns = [clean_column_name(col) for col in df.columns]
-        cols_to_clean = ['cumulative_reward_points', 'redeemed_points', 'balance_points']
-        for col in cols_to_clean:
-            df[col] = df[col].astype(str).str.replace(',', '', regex=False)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-        df = df.dropna(subset=['roll_no'])
-        df['roll_no'] = df['roll_no'].str.upper().str.strip()
-        engine = create_engine(SQLALCHEMY_DB_URL) # This now comes from .env
-        df.to_sql(TABLE_NAME, engine, if_exists='replace', index=False)
-        with engine.begin() as con:
-            con.execute(text(f'ALTER TABLE {TABLE_NAME} ADD PRIMARY KEY (roll_no);'))
-        return {"message": f"Successfully imported {len(df)} records into '{TABLE_NAME}'."}
+        csv_path = await save_csv_upload(file)
+        with track_memory(f"Rewards CSV {file.filename}") as memory:
+            # Staged with COPY and merged in one transaction (csv_import.py)
+            counts = await run_in_threadpool(import_rewards_csv, csv_path, CSV_CHUNK_ROWS, prune)
+        return {
+            "message": (
+                f"Imported {counts['rows']} records into '{TABLE_NAME}': {counts['inserted']} new, "
+                f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['rejected']} rejected."
+            ),
+            **counts,
+            "memory": memory.snapshot()
+        }
+    except HTTPException:
+        raise
     except KeyError as e:
         logger.error(f"Column error in rewards CSV: {e}")
         raise HTTPException(status_code=400, detail=f"CSV file is missing a required column: {e}. Check the file headers.")
     except Exception as e:
         logger.error(f"Failed to upload rewards: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+    finally:
+        if csv_path and os.path.exists(csv_path):
+            os.remove(csv_path)
 
 @router.post("/upload_directory/")
 async def upload_directory(
     file: UploadFile = File(...),
+    prune: bool = False,
     admin_id: str = Depends(get_current_admin_user)
 ):
-    """(This is your new CSV upload endpoint)"""
+    """Upserts directory entries by email. prune=true also deletes emails missing from the file."""
     if file.content_type != 'text/csv':
         raise HTTPException(status_code=400, detail="Invalid file type. Only CSVs are allowed.")
-    TABLE_NAME = "student_directory"
+    TABLE_NAME = DIRECTORY_TABLE
+    csv_path = None
     try:
-        contents = await file.read()
-        df = pd.read_csv(io.BytesIO(contents), header=0)
-        df = df.rename(columns={
-            'Mail id': 'email', 
-            'Register No.': 'roll_no'
-        })
-        df = df[['email', 'roll_no']]
-        df = df.dropna() 
-        df['email'] = df['email'].str.lower().str.strip()
-        df['roll_no'] = df['roll_no'].str.upper().str.strip()
-        df = df[df['email'].str.contains('@')]
-        df = df[df['roll_no'].str.len() > 5]
-        engine = create_engine(SQLALCHEMY_DB_URL) # This now comes from .env
-        df.to_sql(TABLE_NAME, engine, if_exists='replace', index=False)
-        with engine.begin() as con:
-            con.execute(text(f'ALTER TABLE {TABLE_NAME} ADD PRIMARY KEY (email);'))
-            con.execute(text(f'ALTER TABLE {TABLE_NAME} ADD CONSTRAINT roll_no_unique UNIQUE (roll_no);'))
-        return {"message": f"Successfully imported {len(df)} records into '{TABLE_NAME}'."}
+        csv_path = await save_csv_upload(file)
+        with track_memory(f"Directory CSV {file.filename}") as memory:
+            # Staged with COPY and merged in one transaction (csv_import.py)
+            counts = await run_in_threadpool(import_directory_csv, csv_path, CSV_CHUNK_ROWS, prune)
+        return {
+            "message": (
+                f"Imported {counts['rows']} records into '{TABLE_NAME}': {counts['inserted']} new, "
+                f"{counts['updated']} updated, {counts['unchanged']} unchanged, {counts['rejected']} rejected."
+            ),
+            **counts,
+            "memory": memory.snapshot()
+        }
+    except HTTPException:
+        raise
     except KeyError as e:
         logger.error(f"Column error in directory CSV: {e}")
         raise HTTPException(status_code=400, detail=f"CSV file is missing 'Official Email' or 'Roll No'. Check headers.")
     except Exception as e:
         logger.error(f"Failed to upload directory: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {e}")
+    finally:
+        if csv_path and os.path.exists(csv_path):
+            os.remove(csv_path)
+
+
+@router.get("/rejections/{report_id}")
+async def download_rejection_report(report_id: str, admin_id: str = Depends(get_current_admin_user)):
+    """CSV of the rows a rewards/directory import rejected, with the reasons."""
+    path = rejection_report_path(report_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="Rejection report not found.")
+    return FileResponse(path, media_type="text/csv", filename=f"rejections-{report_id}.csv")
 
 
 @router.get("/list/")
-async def list_documents(admin_id: str = Depends(get_current_admin_user)):
-    """(This is your existing list endpoint)"""
-    
-    sql_command = """
-        SELECT DISTINCT cmetadata->>'source'
-        FROM langchain_pg_embedding
-        WHERE collection_id = (
-            SELECT uuid FROM langchain_pg_collection WHERE name = %s
-        )
-    """
-    conn = None
+def list_documents(admin_id: str = Depends(get_current_admin_user)):
+    """Lists ingested PDFs from the documents catalog."""
     try:
-        conn = get_db_conn_psycopg2()
-        with conn.cursor() as curs:
-            curs.execute(sql_command, (COLLECTION_NAME,))
-            results = curs.fetchall() 
-        filenames = sorted([row[0] for row in results if row[0]])
-        return {"documents": filenames}
+        catalog = with_db(list_catalog_documents)
+        return {
+            "documents": [entry["source"] for entry in catalog],
+            "details": catalog
+        }
     except Exception as e:
         logger.error(f"Failed to list documents with SQL: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-    finally:
-        if conn:
-            conn.close()
 
 @router.get("/search/")
-async def search_documents(
+def search_documents(
     query: str,
     admin_id: str = Depends(get_current_admin_user)
 ):
-    """(This is your existing search endpoint)"""
+    """Hybrid (full-text + vector) search over the uploaded documents."""
+    conn = None
     try:
-        results = VECTOR_DB.similarity_search(query, k=5)
+        conn = get_db_conn_psycopg2()
+        scored = hybrid_search_sync(conn, COLLECTION_NAME, query, get_shared_embeddings().embed_query(query), k=5)
+        results = [doc for doc, _ in scored]
         seen_content = set()
         unique_results = []
         for doc in results:
@@ -255,9 +465,12 @@ async def search_documents(
     except Exception as e:
         logger.error(f"Failed to search documents: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    finally:
+        if conn:
+            release_connection(conn)
 
 @router.delete("/delete/{filename}")
-async def delete_document(
+def delete_document(
     filename: str,
     admin_id: str = Depends(get_current_admin_user)
 ):
@@ -275,7 +488,11 @@ async def delete_document(
         with conn.cursor() as curs:
             curs.execute(sql_command, (filename, COLLECTION_NAME))
             count = curs.rowcount
+            delete_document_entry(curs, filename)
             conn.commit()
+        if count > 0:
+            # Guarded: the chunks are already deleted, so a cache failure is only logged
+            refresh_answer_cache()
         if count == 0:
             return {"message": f"No records found for '{filename}' in collection '{COLLECTION_NAME}'"}
         return {"message": f"Deleted {count} chunks for '{filename}'"}
@@ -284,15 +501,84 @@ async def delete_document(
         raise HTTPException(status_code=500, detail=str(e))
     finally:
         if conn:
-            conn.close()
+            release_connection(conn)
 
 
 @router.delete("/delete_collection/")
-async def delete_collection(admin_id: str = Depends(get_current_admin_user)):
+def delete_collection(admin_id: str = Depends(get_current_admin_user)):
     """(This is your existing delete collection endpoint)"""
     try:
-        VECTOR_DB.delete_collection()
+        get_docs_store().delete_collection()
+        with_db(clear_documents)
+        refresh_answer_cache()
         return {"message": f"Entire collection '{COLLECTION_NAME}' deleted successfully."}
     except Exception as e:
         logger.error(f"Failed to delete collection: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# --- VECTOR INDEX ROUTES (vector_index.py) ---
+# Builds and recall checks are slow and blocking, so these are plain `def`
+# routes that FastAPI runs in its threadpool.
+@router.get("/vector_index/")
+def vector_index_status(admin_id: str = Depends(get_current_admin_user)):
+    try:
+        return index_status()
+    except Exception as e:
+        logger.error(f"Failed to read vector index status: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.put("/vector_index/settings")
+def update_vector_search_settings(
+    ef_search: int = None,
+    probes: int = None,
+    admin_id: str = Depends(get_current_admin_user)
+):
+    """Stored in vector_search_settings; every worker's next query uses them (db.py)."""
+    try:
+        settings = with_db(save_vector_search_settings, **{"hnsw.ef_search": ef_search, "ivfflat.probes": probes})
+    except Exception as e:
+        logger.error(f"Failed to save vector search settings: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+    return {"query_settings": settings}
+
+@router.post("/vector_index/{collection_name}")
+def build_vector_index(
+    collection_name: str,
+    method: str = "hnsw",
+    m: int = 16,
+    ef_construction: int = 64,
+    lists: int = None,
+    admin_id: str = Depends(get_current_admin_user)
+):
+    try:
+        return build_index(collection_name, method, m=m, ef_construction=ef_construction, lists=lists)
+    except VectorIndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Failed to build vector index for {collection_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.delete("/vector_index/{collection_name}")
+def drop_vector_index(collection_name: str, admin_id: str = Depends(get_current_admin_user)):
+    try:
+        drop_index(collection_name)
+        return {"message": f"Dropped ANN index for '{collection_name}'"}
+    except Exception as e:
+        logger.error(f"Failed to drop vector index for {collection_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/vector_index/{collection_name}/recall")
+def vector_index_recall(
+    collection_name: str,
+    sample_size: int = 50,
+    k: int = 5,
+    admin_id: str = Depends(get_current_admin_user)
+):
+    try:
+        return check_recall(collection_name, sample_size=sample_size, k=k)
+    except VectorIndexError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Recall check failed for {collection_name}: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
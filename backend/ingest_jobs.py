@@ -0,0 +1,124 @@
+import os
+from psycopg2 import errors
+from psycopg2.extras import RealDictCursor, Json
+
+# --- PDF Ingestion Jobs (ingest_jobs table) ---
+# /ingest/upload/ only records a job; a worker pool in ingest.py does the
+# parsing, splitting and embedding and reports progress here. A job whose
+# worker died (status 'running' but no progress for INGEST_STALE_SECONDS) can
+# be claimed again and resumes from its last embedded chunk.
+# A file has at most one queued or running job (a partial unique index), so
+# the chunk diffs of two uploads of the same source never interleave.
+INGEST_STALE_SECONDS = int(os.getenv("INGEST_STALE_SECONDS", "300"))
+
+JOB_COLUMNS = """
+    job_id, filename, status, pages_total, pages_parsed, chunks_total,
+    chunks_embedded, chunks_added, chunks_kept, chunks_removed, write_mode, chunks_per_sec, rss_delta_mb, peak_rss_mb,
+    error, document_metadata,
+    created_at, updated_at, finished_at
+"""
+
+
+class IngestJobActive(Exception):
+    pass
+
+
+def find_active_job(conn, filename: str):
+    """job_id of the queued or running job for this file, or None."""
+    with conn.cursor() as curs:
+        curs.execute(
+            "SELECT job_id FROM ingest_jobs WHERE filename = %s AND status IN ('queued', 'running')",
+            (filename,)
+        )
+        row = curs.fetchone()
+    conn.rollback()
+    return row[0] if row else None
+
+
+def create_job(conn, job_id: str, filename: str, file_path: str, uploaded_by: str):
+    try:
+        with conn.cursor() as curs:
+            curs.execute(
+                """
+                INSERT INTO ingest_jobs (job_id, filename, file_path, uploaded_by)
+                VALUES (%s, %s, %s, %s)
+                """,
+                (job_id, filename, file_path, uploaded_by)
+            )
+        conn.commit()
+    except errors.UniqueViolation:
+        # idx_ingest_jobs_active_filename: another upload of this file won the race
+        conn.rollback()
+        raise IngestJobActive(f"An ingest job for {filename} is already queued or running.")
+
+
+def claim_job(conn, job_id: str):
+    """Atomically marks a queued (or stale running) job as running. Returns the job row or None."""
+    with conn.cursor(cursor_factory=RealDictCursor) as curs:
+        curs.execute(
+            """
+            UPDATE ingest_jobs
+            SET status = 'running', attempts = attempts + 1, error = NULL, updated_at = NOW()
+            WHERE job_id = %s AND (
+                status = 'queued'
+                OR (status = 'running' AND updated_at < NOW() - make_interval(secs => %s))
+            )
+            RETURNING job_id, filename, file_path, uploaded_by
+            """,
+            (job_id, INGEST_STALE_SECONDS)
+        )
+        job = curs.fetchone()
+    conn.commit()
+    return job
+
+
+def find_resumable_jobs(conn):
+    with conn.cursor() as curs:
+        curs.execute(
+            """
+            SELECT job_id FROM ingest_jobs
+            WHERE status = 'queued'
+               OR (status = 'running' AND updated_at < NOW() - make_interval(secs => %s))
+            ORDER BY created_at
+            """,
+            (INGEST_STALE_SECONDS,)
+        )
+        return [row[0] for row in curs.fetchall()]
+
+
+def update_job_progress(conn, job_id: str, **fields):
+    """Updates counters (pages_total, pages_parsed, chunks_total, chunks_embedded, ...) and the heartbeat."""
+    if "document_metadata" in fields:
+        fields["document_metadata"] = Json(fields["document_metadata"])
+    assignments = ", ".join(f"{column} = %s" for column in fields)
+    with conn.cursor() as curs:
+        curs.execute(
+            f"UPDATE ingest_jobs SET {assignments}, updated_at = NOW() WHERE job_id = %s",
+            (*fields.values(), job_id)
+        )
+    conn.commit()
+
+
+def finish_job(conn, job_id: str, status: str, error: str = None):
+    with conn.cursor() as curs:
+        curs.execute(
+            """
+            UPDATE ingest_jobs
+            SET status = %s, error = %s, updated_at = NOW(), finished_at = NOW()
+            WHERE job_id = %s
+            """,
+            (status, error, job_id)
+        )
+    conn.commit()
+
+
+def get_job(conn, job_id: str):
+    with conn.cursor(cursor_factory=RealDictCursor) as curs:
+        curs.execute(f"SELECT {JOB_COLUMNS} FROM ingest_jobs WHERE job_id = %s", (job_id,))
+        return curs.fetchone()
+
+
+def list_jobs(conn, limit: int = 50):
+    with conn.cursor(cursor_factory=RealDictCursor) as curs:
+        curs.execute(f"SELECT {JOB_COLUMNS} FROM ingest_jobs ORDER BY created_at DESC LIMIT %s", (limit,))
+        return curs.fetchall()
@@ -14,6 +14,10 @@ if not DB_URL:
 
 # --- All the SQL commands to build your database ---
 SQL_COMMANDS = [
+    """
+    -- pgvector (needed by PGVector and the answer cache)
+    CREATE EXTENSION IF NOT EXISTS vector;
+    """,
     """
     -- Create the ENUM type for user roles (if it doesn't exist)
     DO $$
@@ -110,6 +114,156 @@ SQL_COMMANDS = [
         resolution_message TEXT 
     );
     """,
+    """
+    -- 8. Semantic answer cache for /bot/ask (all-MiniLM-L6-v2 -> 384 dims)
+    CREATE TABLE IF NOT EXISTS answer_cache (
+        id SERIAL PRIMARY KEY,
+        question TEXT NOT NULL,
+        embedding vector(384) NOT NULL,
+        answer TEXT NOT NULL,
+        llm_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+        hit_count INTEGER NOT NULL DEFAULT 0,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        last_hit_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    -- 9. Shared counters for the answer cache (single row)
+    CREATE TABLE IF NOT EXISTS answer_cache_stats (
+        id BOOLEAN PRIMARY KEY DEFAULT TRUE CHECK (id),
+        generation BIGINT NOT NULL DEFAULT 0, -- bumped whenever documents change
+        lookups BIGINT NOT NULL DEFAULT 0,
+        hits BIGINT NOT NULL DEFAULT 0,
+        saved_llm_seconds DOUBLE PRECISION NOT NULL DEFAULT 0,
+        invalidations BIGINT NOT NULL DEFAULT 0
+    );
+    """,
+    """
+    INSERT INTO answer_cache_stats (id) VALUES (TRUE) ON CONFLICT (id) DO NOTHING;
+    """,
+    """
+    -- 10. Rolling per-session chat summaries
+    CREATE TABLE IF NOT EXISTS chat_summaries (
+        session_id TEXT PRIMARY KEY REFERENCES chat_sessions(session_id) ON DELETE CASCADE,
+        summary TEXT NOT NULL,
+        messages_summarized INTEGER NOT NULL DEFAULT 0, -- checkpoint into bot_chat_history
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    -- 11. Queue of answered questions waiting for preference extraction
+    CREATE TABLE IF NOT EXISTS preference_jobs (
+        id BIGSERIAL PRIMARY KEY,
+        user_id TEXT NOT NULL REFERENCES users(id) ON DELETE CASCADE,
+        question TEXT NOT NULL,
+        answer TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending', -- 'pending', 'failed'
+        attempts INTEGER NOT NULL DEFAULT 0,
+        last_error TEXT,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    -- 12. Background PDF ingestion jobs (/ingest/upload/)
+    CREATE TABLE IF NOT EXISTS ingest_jobs (
+        job_id TEXT PRIMARY KEY,
+        filename TEXT NOT NULL,
+        file_path TEXT NOT NULL,
+        uploaded_by TEXT,
+        status TEXT NOT NULL DEFAULT 'queued', -- 'queued', 'running', 'completed', 'failed'
+        attempts INTEGER NOT NULL DEFAULT 0,
+        pages_total INTEGER,
+        pages_parsed INTEGER NOT NULL DEFAULT 0,
+        chunks_total INTEGER,
+        chunks_embedded INTEGER NOT NULL DEFAULT 0,
+        chunks_added INTEGER, -- incremental re-ingestion counts (content hash diff)
+        chunks_kept INTEGER,
+        chunks_removed INTEGER,
+        write_mode TEXT, -- INGEST_WRITE_MODE used: 'copy' or 'langchain'
+        chunks_per_sec REAL,
+        rss_delta_mb REAL, -- process memory over the job (upload_utils.MemoryReport)
+        peak_rss_mb REAL,
+        error TEXT,
+        document_metadata JSONB,
+        created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        finished_at TIMESTAMP WITH TIME ZONE
+    );
+    """,
+    """
+    -- 13. Catalog of ingested PDFs (/ingest/list/)
+    CREATE TABLE IF NOT EXISTS documents (
+        source TEXT PRIMARY KEY,
+        page_count INTEGER,
+        chunk_count INTEGER NOT NULL DEFAULT 0,
+        content_hash TEXT, -- sha256 of the uploaded file
+        uploaded_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        uploaded_by TEXT
+    );
+    """,
+    """
+    -- 14. hnsw.ef_search / ivfflat.probes set by PUT /ingest/vector_index/settings (db.py)
+    CREATE TABLE IF NOT EXISTS vector_search_settings (
+        name TEXT PRIMARY KEY,
+        value INTEGER NOT NULL,
+        updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    """,
+    """
+    -- Backfill the catalog from chunks ingested before it existed
+    DO $$
+    BEGIN
+        IF to_regclass('langchain_pg_embedding') IS NOT NULL THEN
+            CREATE INDEX IF NOT EXISTS idx_langchain_pg_embedding_source
+            ON langchain_pg_embedding (collection_id, (cmetadata->>'source'));
+
+            INSERT INTO documents (source, page_count, chunk_count)
+            SELECT e.cmetadata->>'source', MAX((e.cmetadata->>'page_number')::int), COUNT(*)
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+            WHERE c.name = 'New_embeddings' AND e.cmetadata->>'source' IS NOT NULL
+            GROUP BY e.cmetadata->>'source'
+            ON CONFLICT (source) DO NOTHING;
+        END IF;
+    END $$;
+    """,
+    """
+    -- Full-text column + GIN index for hybrid search (hybrid_search.py).
+    -- Guarded so re-runs never take the table lock for nothing.
+    DO $$
+    BEGIN
+        IF to_regclass('langchain_pg_embedding') IS NOT NULL THEN
+            IF NOT EXISTS (
+                SELECT 1 FROM pg_attribute
+                WHERE attrelid = 'langchain_pg_embedding'::regclass AND attname = 'document_tsv' AND NOT attisdropped
+            ) THEN
+                ALTER TABLE langchain_pg_embedding ADD COLUMN document_tsv tsvector
+                GENERATED ALWAYS AS (to_tsvector('english', coalesce(document, ''))) STORED;
+            END IF;
+            IF to_regclass('idx_langchain_pg_embedding_tsv') IS NULL THEN
+                CREATE INDEX idx_langchain_pg_embedding_tsv ON langchain_pg_embedding USING gin (document_tsv);
+            END IF;
+        END IF;
+    END $$;
+    """,
+    """
+    -- Fixed-dimension embedding column, needed for ANN indexes (vector_index.py).
+    -- Rewrites langchain_pg_embedding under an exclusive lock; skipped when it is
+    -- already typed or when some stored vector has another dimension.
+    DO $$
+    BEGIN
+        IF to_regclass('langchain_pg_embedding') IS NOT NULL
+           AND (SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+                WHERE attrelid = 'langchain_pg_embedding'::regclass AND attname = 'embedding') <> 'vector(384)'
+        THEN
+            IF EXISTS (SELECT 1 FROM langchain_pg_embedding WHERE vector_dims(embedding) <> 384) THEN
+                RAISE NOTICE 'langchain_pg_embedding has vectors that are not 384-dimensional; embedding column left untyped';
+            ELSE
+                ALTER TABLE langchain_pg_embedding ALTER COLUMN embedding TYPE vector(384);
+            END IF;
+        END IF;
+    END $$;
+    """,
     
     # --- Indexes (Moved to the end) ---
     """
@@ -123,6 +277,26 @@ SQL_COMMANDS = [
     """,
     """
     CREATE INDEX IF NOT EXISTS idx_feedback_tickets_department ON feedback_tickets(department, status);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_feedback_tickets_user_id ON feedback_tickets(user_id, created_at DESC);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_answer_cache_last_hit_at ON answer_cache(last_hit_at);
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_preference_jobs_pending ON preference_jobs(id) WHERE status = 'pending';
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_ingest_jobs_status ON ingest_jobs(status, updated_at);
+    """,
+    """
+    ALTER TABLE ingest_jobs ADD COLUMN IF NOT EXISTS rss_delta_mb REAL, ADD COLUMN IF NOT EXISTS peak_rss_mb REAL;
+    """,
+    """
+    -- One queued/running job per file: two diffs of the same source would undo each other (ingest.py)
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_ingest_jobs_active_filename
+    ON ingest_jobs(filename) WHERE status IN ('queued', 'running');
     """
 ]
 
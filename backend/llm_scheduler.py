@@ -0,0 +1,212 @@
+import os
+import time
+import heapq
+import asyncio
+import hashlib
+import itertools
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+from langchain_core.runnables import Runnable, RunnableConfig
+from db import async_connection
+
+# --- LLM Scheduler ---
+# All generations on the single local Ollama model go through one gate:
+#   - at most LLM_MAX_CONCURRENCY generations run at once, the rest queue
+#   - the queue is ordered by priority, so interactive answers overtake
+#     summaries and preference extraction
+#   - identical prompts that are already being generated are coalesced: the
+#     late callers wait for the first generation instead of starting another
+# The queue and LLM_MAX_CONCURRENCY are per process. Every uvicorn worker and
+# preference_worker.py share one Ollama, so a generation also needs one of
+# LLM_GLOBAL_CONCURRENCY slots held as Postgres advisory locks. The last slot
+# is reserved for interactive answers, so summaries and extraction in any
+# process can never occupy all of them (0 disables the shared gate).
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "2"))
+LLM_GLOBAL_CONCURRENCY = int(os.getenv("LLM_GLOBAL_CONCURRENCY", "2"))
+LLM_GATE_POLL_SECONDS = float(os.getenv("LLM_GATE_POLL_SECONDS", "0.2"))
+LLM_GATE_LOCK_CLASS = 7381  # first key of pg_try_advisory_xact_lock(class, slot)
+
+PRIORITY_INTERACTIVE = 0
+PRIORITY_SUMMARY = 1
+PRIORITY_EXTRACTION = 2
+PRIORITY_NAMES = {
+    PRIORITY_INTERACTIVE: "interactive",
+    PRIORITY_SUMMARY: "summary",
+    PRIORITY_EXTRACTION: "extraction",
+}
+
+
+@asynccontextmanager
+async def global_llm_slot(priority: int, slots: int = LLM_GLOBAL_CONCURRENCY):
+    """
+    Holds one of `slots` cross-process slots for the duration of a generation.
+    Transaction-level advisory locks (released by the rollback) also work
+    behind a transaction-mode pooler such as PgBouncer.
+    """
+    if slots <= 0:
+        yield
+        return
+    usable = range(slots if priority == PRIORITY_INTERACTIVE else max(slots - 1, 1))
+    async with async_connection() as conn:
+        try:
+            while True:
+                for slot in usable:
+                    row = await (await conn.execute(
+                        "SELECT pg_try_advisory_xact_lock(%s, %s) AS locked", (LLM_GATE_LOCK_CLASS, slot)
+                    )).fetchone()
+                    if row["locked"]:
+                        break
+                else:
+                    await asyncio.sleep(LLM_GATE_POLL_SECONDS)
+                    continue
+                break
+            yield
+        finally:
+            await conn.rollback()
+
+
+class LLMScheduler:
+    def __init__(self, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.max_concurrency = max_concurrency
+        self._active = 0
+        self._waiters = []  # heap of (priority, seq, future)
+        self._seq = itertools.count()
+        self._inflight = {}  # prompt key -> {"task", "waiters"} shared by coalesced callers
+        self.generations = 0
+        self.coalesced = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.max_wait_seconds = 0.0
+
+    # --- Priority gate ---
+    async def _acquire(self, priority: int):
+        if self._active < self.max_concurrency and not self._waiters:
+            self._active += 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.max_queue_depth = max(self.max_queue_depth, self.queue_depth())
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # The slot was handed to us just before we were cancelled
+                self._release()
+            raise
+
+    def _release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)  # hand our slot straight to the next waiter
+                return
+        self._active -= 1
+
+    @asynccontextmanager
+    async def slot(self, priority: int):
+        started = time.perf_counter()
+        await self._acquire(priority)
+        waited = time.perf_counter() - started
+        self.total_wait_seconds += waited
+        self.max_wait_seconds = max(self.max_wait_seconds, waited)
+        self.generations += 1
+        try:
+            async with global_llm_slot(priority):
+                yield
+        finally:
+            self._release()
+
+    # --- Generation ---
+    async def generate(self, llm, llm_input: Any, priority: int, config: Optional[RunnableConfig] = None):
+        key = prompt_key(llm, llm_input)
+        entry = self._inflight.get(key)
+        if entry is not None:
+            self.coalesced += 1
+        else:
+            # The generation runs in its own task, so it belongs to no single caller
+            task = asyncio.create_task(self._generate(llm, llm_input, priority, config))
+            entry = self._inflight[key] = {"task": task, "waiters": 0}
+            task.add_done_callback(lambda _: self._forget(key, entry))
+
+        entry["waiters"] += 1
+        try:
+            # shield: one impatient caller must not cancel everybody's generation
+            return await asyncio.shield(entry["task"])
+        except asyncio.CancelledError:
+            if entry["waiters"] == 1 and not entry["task"].done():
+                entry["task"].cancel()  # the last caller left; free the slot
+            raise
+        finally:
+            entry["waiters"] -= 1
+
+    async def _generate(self, llm, llm_input: Any, priority: int, config: Optional[RunnableConfig]):
+        async with self.slot(priority):
+            return await llm.ainvoke(llm_input, config)
+
+    def _forget(self, key: str, entry: dict):
+        if self._inflight.get(key) is entry:
+            del self._inflight[key]
+        task = entry["task"]
+        if not task.cancelled():
+            task.exception()  # mark as retrieved when every caller had already left
+
+    async def stream(self, llm, llm_input: Any, priority: int,
+                     config: Optional[RunnableConfig] = None) -> AsyncIterator:
+        # Streams are gated but not coalesced: their tokens belong to one client
+        async with self.slot(priority):
+            async for chunk in llm.astream(llm_input, config):
+                yield chunk
+
+    # --- Metrics ---
+    def queue_depth(self) -> int:
+        return sum(1 for _, _, future in self._waiters if not future.done())
+
+    def stats(self) -> dict:
+        queued = {name: 0 for name in PRIORITY_NAMES.values()}
+        for priority, _, future in self._waiters:
+            if not future.done():
+                queued[PRIORITY_NAMES.get(priority, str(priority))] += 1
+        return {
+            "max_concurrency": self.max_concurrency,
+            "active": self._active,
+            "queue_depth": sum(queued.values()),
+            "queued_by_priority": queued,
+            "max_queue_depth": self.max_queue_depth,
+            "generations": self.generations,
+            "coalesced": self.coalesced,
+            "avg_wait_ms": round(1000 * self.total_wait_seconds / self.generations, 2) if self.generations else 0.0,
+            "max_wait_ms": round(1000 * self.max_wait_seconds, 2),
+        }
+
+
+def prompt_key(llm, llm_input: Any) -> str:
+    text = llm_input.to_string() if hasattr(llm_input, "to_string") else str(llm_input)
+    model = getattr(llm, "model", type(llm).__name__)
+    return hashlib.sha256(f"{model}\x00{text}".encode("utf-8")).hexdigest()
+
+
+# One scheduler per process, shared by every chain
+llm_scheduler = LLMScheduler()
+
+
+# --- Runnable wrapper ---
+class ScheduledLLM(Runnable):
+    """
+    Drop-in replacement for an LLM inside a chain (prompt | llm | parser) that
+    routes ainvoke/astream through the scheduler at a fixed priority.
+    """
+    def __init__(self, llm, priority: int, scheduler: LLMScheduler = llm_scheduler):
+        self.llm = llm
+        self.priority = priority
+        self.scheduler = scheduler
+
+    def invoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs):
+        # Sync callers (scripts) bypass the async gate
+        return self.llm.invoke(input, config, **kwargs)
+
+    async def ainvoke(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs):
+        return await self.scheduler.generate(self.llm, input, self.priority, config)
+
+    async def astream(self, input: Any, config: Optional[RunnableConfig] = None, **kwargs):
+        async for chunk in self.scheduler.stream(self.llm, input, self.priority, config):
+            yield chunk
@@ -1,12 +1,22 @@
 import os
+import sys
+import time
+import asyncio
 import uvicorn
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from dotenv import load_dotenv
 
+# Startup time reported by registry.warm_up() starts here
+IMPORT_STARTED = time.perf_counter()
+
 # Load environment variables (like your .env file)
 load_dotenv()
 
+# The chatbot uses psycopg's async driver, which needs a selector event loop on Windows.
+if sys.platform == "win32":
+    asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+
 # --- 1. Import Your Routers ---
 # Import the 'router' variable from each of your files
 from auth_routes import router as auth_router
@@ -14,6 +24,12 @@ from apibot import router as bot_router
 from ingest import router as ingest_router
 from feedback import router as feedback_router
 from department_api import router as department_router # <-- ADD THIS
+from db import open_pools, close_pools, listen_for_vector_search_settings
+from preference_index import listen_for_preference_changes
+from ingest import sweep_ingest_jobs
+from pdf_extract import shutdown_extract_pool
+from registry import warm_up
+from fastapi.concurrency import run_in_threadpool
 # Create the main FastAPI application
 app = FastAPI()
 
@@ -45,13 +61,39 @@ app.include_router(ingest_router, prefix="/ingest")
 # This will make your new endpoint available at /bot/feedback
 app.include_router(feedback_router, prefix="/bot", tags=["Feedback"])
 app.include_router(department_router) # <-- ADD THIS
-# --- 4. Root Endpoint ---
+# --- 4. Shared Database Pools & Background Tasks ---
+# One pooled database layer (db.py) for every router, opened once per worker.
+background_tasks = []
+# Routers are imported by now; nothing above loaded a model or touched the database
+IMPORT_SECONDS = time.perf_counter() - IMPORT_STARTED
+
+@app.on_event("startup")
+async def startup():
+    await open_pools()
+    # Keeps the in-memory preference index in sync with preference_worker.py
+    background_tasks.append(asyncio.create_task(listen_for_preference_changes()))
+    # Keeps ef_search/probes for engine connections in step with PUT /ingest/vector_index/settings
+    background_tasks.append(asyncio.create_task(listen_for_vector_search_settings()))
+    # Picks up PDF ingest jobs that were queued or interrupted by a crash, now
+    # and every INGEST_STALE_SECONDS/2
+    background_tasks.append(asyncio.create_task(sweep_ingest_jobs()))
+    # Docs store + (unless STARTUP_WARMUP=false) the models; logs time and RSS
+    await run_in_threadpool(warm_up, IMPORT_SECONDS)
+
+@app.on_event("shutdown")
+async def shutdown():
+    for task in background_tasks:
+        task.cancel()
+    shutdown_extract_pool()
+    await close_pools()
+
+# --- 5. Root Endpoint ---
 @app.get("/")
 def read_root():
     return {"message": "Welcome to your combined backend API"}
 
 
-# --- 5. Run the App ---
+# --- 6. Run the App ---
 if __name__ == "__main__":
     # This allows you to run the app by typing 'python main.py'
     # although 'uvicorn main:app --reload' is usually better.
@@ -0,0 +1,87 @@
+import os
+import threading
+import multiprocessing
+import fitz      # For PyMuPDF
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# --- Parallel PDF Text Extraction ---
+# page.get_text() is CPU-bound and holds the GIL, so large PDFs are split
+# into page ranges and each range is extracted in a separate process. Every
+# worker opens the file itself (fitz documents cannot be pickled) and only
+# (page_number, text) pairs travel back. Small PDFs are extracted inline,
+# where starting worker processes would cost more than it saves.
+# Workers are spawned, not forked: the pool starts from an ingest thread of the
+# API process, whose torch/tokenizer threads and event loop must not be copied
+# into a child. They only import this module (and fitz).
+PDF_EXTRACT_WORKERS = int(os.getenv("PDF_EXTRACT_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_SHARD = int(os.getenv("PDF_PAGES_PER_SHARD", "50"))
+PDF_PARALLEL_MIN_PAGES = int(os.getenv("PDF_PARALLEL_MIN_PAGES", "100"))
+
+_extract_pool = None
+_extract_pool_lock = threading.Lock()
+
+
+def get_extract_pool() -> ProcessPoolExecutor:
+    global _extract_pool
+    if _extract_pool is None:
+        with _extract_pool_lock:
+            if _extract_pool is None:
+                _extract_pool = ProcessPoolExecutor(
+                    max_workers=PDF_EXTRACT_WORKERS, mp_context=multiprocessing.get_context("spawn")
+                )
+    return _extract_pool
+
+
+def shutdown_extract_pool():
+    global _extract_pool
+    if _extract_pool is not None:
+        _extract_pool.shutdown(cancel_futures=True)
+        _extract_pool = None
+
+
+def extract_page_range(file_path: str, start: int, stop: int):
+    """Runs in a worker process. Returns [(page_number, text)] for pages [start, stop) that have text."""
+    pages = []
+    with fitz.open(file_path) as doc:
+        for page_index in range(start, stop):
+            page_text = doc[page_index].get_text()
+            if page_text.strip():
+                pages.append((page_index + 1, page_text))
+    return pages
+
+
+def read_pdf_info(file_path: str):
+    """Returns (doc_metadata, page_count) without extracting any text."""
+    with fitz.open(file_path) as doc:
+        return doc.metadata, doc.page_count
+
+
+def extract_pages(file_path: str, page_count: int, on_progress=None):
+    """
+    Returns [(page_number, text)] in page order, skipping pages without text.
+    on_progress(pages_parsed) is called as page ranges finish.
+    """
+    if page_count < PDF_PARALLEL_MIN_PAGES or PDF_EXTRACT_WORKERS <= 1:
+        pages = extract_page_range(file_path, 0, page_count)
+        if on_progress:
+            on_progress(page_count)
+        return pages
+
+    shards = [
+        (start, min(start + PDF_PAGES_PER_SHARD, page_count))
+        for start in range(0, page_count, PDF_PAGES_PER_SHARD)
+    ]
+    pool = get_extract_pool()
+    futures = {pool.submit(extract_page_range, file_path, start, stop): (start, stop) for start, stop in shards}
+    results = {}
+    pages_parsed = 0
+    for future in as_completed(futures):
+        start, stop = futures[future]
+        results[start] = future.result()
+        pages_parsed += stop - start
+        if on_progress:
+            on_progress(pages_parsed)
+
+    # Shards finish out of order; merge them back by their first page
+    pages = [page for start, _ in shards for page in results[start]]
+    return pages
@@ -0,0 +1,134 @@
+import os
+import json
+import time
+import asyncio
+import numpy as np
+import psycopg
+from collections import OrderedDict
+from typing import List, Tuple
+from psycopg.types.json import Jsonb
+from langchain_core.documents import Document
+from db import async_connection, DB_URL_STANDARD
+
+# --- Per-User Preference Index ---
+# A user only has a handful of learned facts, so instead of a filtered PGVector
+# query per chat turn, each active user's fact vectors are kept in memory as a
+# small normalized NumPy matrix and scored locally.
+#   - loaded lazily on the user's first question, evicted LRU
+#   - invalidated by a Postgres NOTIFY on PREFERENCE_CHANNEL, which the
+#     preference worker sends whenever it stores new facts
+#   - entries also expire after PREFERENCE_INDEX_TTL_SECONDS, in case a
+#     notification was missed while the listener was reconnecting
+PREFERENCE_INDEX_MAX_USERS = int(os.getenv("PREFERENCE_INDEX_MAX_USERS", "2048"))
+PREFERENCE_INDEX_TTL_SECONDS = float(os.getenv("PREFERENCE_INDEX_TTL_SECONDS", "600"))
+PREFERENCE_CHANNEL = "preferences_changed"
+COLLECTION_NAME_PREFS = "user_preferences"
+
+
+class UserPreferences:
+    __slots__ = ("texts", "vectors", "loaded_at")
+
+    def __init__(self, texts: List[str], vectors: np.ndarray):
+        self.texts = texts
+        self.vectors = vectors  # shape (n_facts, dim), rows L2-normalized
+        self.loaded_at = time.monotonic()
+
+
+class PreferenceIndex:
+    def __init__(self, max_users: int = PREFERENCE_INDEX_MAX_USERS, ttl_seconds: float = PREFERENCE_INDEX_TTL_SECONDS):
+        self.max_users = max_users
+        self.ttl_seconds = ttl_seconds
+        self._users = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    async def search(self, user_id: str, question_vector: List[float], k: int = 2) -> List[Tuple[Document, float]]:
+        """Returns the user's k closest facts as [(doc, cosine distance)], like PGVector."""
+        entry = await self._get(user_id)
+        if not entry.texts:
+            return []
+        query = np.asarray(question_vector, dtype=np.float32)
+        query /= (np.linalg.norm(query) or 1.0)
+        similarities = entry.vectors @ query
+        top = np.argsort(-similarities)[:k]
+        return [
+            (Document(page_content=entry.texts[i], metadata={"user_id": user_id}), float(1.0 - similarities[i]))
+            for i in top
+        ]
+
+    async def _get(self, user_id: str) -> UserPreferences:
+        entry = self._users.get(user_id)
+        if entry is not None and time.monotonic() - entry.loaded_at < self.ttl_seconds:
+            self._users.move_to_end(user_id)
+            self.hits += 1
+            return entry
+
+        self.misses += 1
+        entry = await load_user_preferences(user_id)
+        self._users[user_id] = entry
+        self._users.move_to_end(user_id)
+        while len(self._users) > self.max_users:
+            self._users.popitem(last=False)
+        return entry
+
+    def invalidate(self, user_id: str):
+        if self._users.pop(user_id, None) is not None:
+            self.invalidations += 1
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "users_cached": len(self._users),
+            "max_users": self.max_users,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "invalidations": self.invalidations,
+        }
+
+
+async def load_user_preferences(user_id: str) -> UserPreferences:
+    async with async_connection() as conn:
+        # cmetadata @> uses the GIN index langchain_postgres creates on cmetadata
+        cur = await conn.execute(
+            """
+            SELECT e.document, e.embedding::text AS embedding
+            FROM langchain_pg_embedding e
+            JOIN langchain_pg_collection c ON e.collection_id = c.uuid
+            WHERE c.name = %s AND e.cmetadata @> %s
+            """,
+            (COLLECTION_NAME_PREFS, Jsonb({"user_id": user_id}))
+        )
+        rows = await cur.fetchall()
+    if not rows:
+        return UserPreferences([], np.empty((0, 0), dtype=np.float32))
+    vectors = np.array([json.loads(row["embedding"]) for row in rows], dtype=np.float32)
+    vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+    return UserPreferences([row["document"] for row in rows], vectors)
+
+
+# One index per API process
+preference_index = PreferenceIndex()
+
+
+# --- Change notifications ---
+async def notify_preferences_changed(conn, user_ids):
+    """Queues a NOTIFY per user; Postgres delivers them when `conn` commits."""
+    for user_id in set(user_ids):
+        await conn.execute("SELECT pg_notify(%s, %s)", (PREFERENCE_CHANNEL, user_id))
+
+
+async def listen_for_preference_changes():
+    """Long-running task (started from main.py) that evicts users whose facts changed."""
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(DB_URL_STANDARD, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {PREFERENCE_CHANNEL}")
+                async for notification in conn.notifies():
+                    preference_index.invalidate(notification.payload)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            print(f"⚠️ Preference change listener disconnected: {e}")
+            await asyncio.sleep(5)
@@ -0,0 +1,53 @@
+import os
+from typing import List
+
+# --- Preference Extraction Job Queue (preference_jobs table) ---
+# /bot/ask enqueues one row per answered question; preference_worker.py claims
+# pending rows in batches. Claimed rows stay locked for the worker's
+# transaction, so a crashed worker simply leaves them pending for the next one.
+PREFERENCE_JOB_MAX_ATTEMPTS = int(os.getenv("PREFERENCE_JOB_MAX_ATTEMPTS", "3"))
+
+
+async def enqueue_preference_job(conn, user_id: str, question: str, answer: str):
+    await conn.execute(
+        "INSERT INTO preference_jobs (user_id, question, answer) VALUES (%s, %s, %s)",
+        (user_id, question, answer)
+    )
+    await conn.commit()
+
+
+async def claim_preference_jobs(conn, limit: int) -> List[dict]:
+    """
+    Locks up to `limit` pending jobs inside the current transaction.
+    SKIP LOCKED lets several workers run side by side without double work.
+    """
+    cur = await conn.execute(
+        """
+        SELECT id, user_id, question, answer
+        FROM preference_jobs
+        WHERE status = 'pending'
+        ORDER BY id
+        LIMIT %s
+        FOR UPDATE SKIP LOCKED
+        """,
+        (limit,)
+    )
+    return await cur.fetchall()
+
+
+async def complete_preference_jobs(conn, job_ids: List[int]):
+    await conn.execute("DELETE FROM preference_jobs WHERE id = ANY(%s)", (job_ids,))
+
+
+async def fail_preference_jobs(conn, job_ids: List[int], error: str):
+    """Records a failed attempt; jobs are parked as 'failed' after PREFERENCE_JOB_MAX_ATTEMPTS."""
+    await conn.execute(
+        """
+        UPDATE preference_jobs
+        SET attempts = attempts + 1,
+            last_error = %s,
+            status = CASE WHEN attempts + 1 >= %s THEN 'failed' ELSE 'pending' END
+        WHERE id = ANY(%s)
+        """,
+        (error[:1000], PREFERENCE_JOB_MAX_ATTEMPTS, job_ids)
+    )
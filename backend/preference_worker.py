@@ -0,0 +1,101 @@
+import os
+import sys
+import asyncio
+from typing import List, Optional
+from pydantic import BaseModel, Field
+from langchain_core.prompts import ChatPromptTemplate
+from langchain_core.output_parsers import JsonOutputParser
+from langchain_core.documents import Document
+from dotenv import load_dotenv
+from langchain_ollama import OllamaLLM
+from registry import get_preference_store
+from db import async_connection
+from llm_scheduler import ScheduledLLM, PRIORITY_EXTRACTION
+from preference_index import notify_preferences_changed
+from preference_jobs import claim_preference_jobs, complete_preference_jobs, fail_preference_jobs
+
+# --- Background Preference Extraction Worker ---
+# Run alongside the API:   python preference_worker.py
+# Several workers can run at once; each claims its own batch of jobs.
+load_dotenv()
+
+PREFERENCE_BATCH_SIZE = int(os.getenv("PREFERENCE_BATCH_SIZE", "8"))
+PREFERENCE_POLL_SECONDS = float(os.getenv("PREFERENCE_POLL_SECONDS", "2"))
+
+# Same model as the chatbot (apibot.py), built here so the worker does not
+# import the whole router
+llm = OllamaLLM(model="llama3.1")
+
+# --- Batched Preference Extractor ---
+# One LLM call covers a whole batch of (question, answer) pairs.
+class ExtractedPreference(BaseModel):
+    exchange_id: int = Field(description="The number of the exchange the fact was learned from.")
+    fact: Optional[str] = Field(description="A single fact or preference learned about the user.")
+
+class ExtractedPreferences(BaseModel):
+    preferences: List[ExtractedPreference] = Field(description="One entry per learned fact. Empty if nothing was learned.")
+
+extractor_parser = JsonOutputParser(pydantic_object=ExtractedPreferences)
+extractor_prompt = ChatPromptTemplate.from_template(
+    "Analyze each exchange below.\n{exchanges}\nFor every exchange where a new permanent fact or preference about the user is learned, output it with the exchange number. Skip exchanges that teach nothing.\n{format_instructions}"
+)
+preference_extraction_chain = extractor_prompt | ScheduledLLM(llm, PRIORITY_EXTRACTION) | extractor_parser
+
+def format_exchanges(jobs: List[dict]) -> str:
+    return "\n".join(
+        f"Exchange {job['id']}:\nUser: {job['question']}\nAI: {job['answer']}\n" for job in jobs
+    )
+
+async def process_batch(conn) -> int:
+    """Claims, extracts and stores one batch. Returns the number of jobs handled."""
+    jobs = await claim_preference_jobs(conn, PREFERENCE_BATCH_SIZE)
+    if not jobs:
+        await conn.rollback()
+        return 0
+
+    jobs_by_id = {job["id"]: job for job in jobs}
+    try:
+        result = await preference_extraction_chain.ainvoke({
+            "exchanges": format_exchanges(jobs),
+            "format_instructions": extractor_parser.get_format_instructions()
+        })
+        docs, ids = [], []
+        for i, item in enumerate((result or {}).get("preferences") or []):
+            job = jobs_by_id.get(item.get("exchange_id"))
+            fact = (item.get("fact") or "").strip()
+            if job and fact:
+                docs.append(Document(page_content=fact, metadata={"user_id": job["user_id"]}))
+                # Deterministic ids: a retried batch overwrites instead of duplicating
+                ids.append(f"prefjob-{job['id']}-{i}")
+        if docs:
+            # Embeds every fact of the batch in a single call
+            await get_preference_store().aadd_documents(docs, ids=ids)
+            # Tells the API processes to reload these users' preference index
+            await notify_preferences_changed(conn, [doc.metadata["user_id"] for doc in docs])
+        await complete_preference_jobs(conn, list(jobs_by_id))
+        await conn.commit()
+        print(f"✅ Processed {len(jobs)} preference jobs, stored {len(docs)} facts")
+    except Exception as e:
+        print(f"⚠️ Preference batch failed: {e}")
+        await conn.rollback()
+        await fail_preference_jobs(conn, list(jobs_by_id), str(e))
+        await conn.commit()
+    return len(jobs)
+
+async def run_worker():
+    print("Preference worker started.")
+    while True:
+        try:
+            async with async_connection() as conn:
+                processed = await process_batch(conn)
+        except Exception as e:
+            print(f"❌ Preference worker database error: {e}")
+            processed = 0
+        if not processed:
+            await asyncio.sleep(PREFERENCE_POLL_SECONDS)
+
+if __name__ == "__main__":
+    # psycopg's async driver needs a selector event loop on Windows (as in main.py)
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(run_worker())
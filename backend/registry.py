@@ -0,0 +1,159 @@
+import os
+import sys
+import time
+import logging
+import threading
+from sqlalchemy import text
+from langchain_postgres import PGVector
+from db import get_sync_engine, get_async_engine
+from embedding_cache import get_shared_embeddings
+from document_catalog import SOURCE_INDEX_SQL
+from hybrid_search import TSV_COLUMN_SQL, TSV_INDEX_SQL
+from reranker import RERANK_ENABLED, get_reranker
+
+logger = logging.getLogger(__name__)
+
+# --- Shared Model & Vector Store Registry ---
+# Importing the routers loads no model and opens no database connection:
+#   - the embedding model is loaded once per process, on first use
+#     (get_shared_embeddings)
+#   - PGVector stores are created on first use and shared by every router
+#   - main.py's startup hook calls warm_up(), which prepares the docs store and,
+#     unless STARTUP_WARMUP=false, loads the models before the first request
+# Startup time and resident memory are recorded for /bot/stats.
+COLLECTION_NAME_DOCS = "New_embeddings"
+COLLECTION_NAME_PREFS = "user_preferences"
+STARTUP_WARMUP = os.getenv("STARTUP_WARMUP", "true").lower() == "true"
+
+SEARCH_SCHEMA_READY_SQL = """
+    SELECT to_regclass('idx_langchain_pg_embedding_source') IS NOT NULL
+       AND to_regclass('idx_langchain_pg_embedding_tsv') IS NOT NULL
+       AND EXISTS (
+           SELECT 1 FROM pg_attribute
+           WHERE attrelid = 'langchain_pg_embedding'::regclass AND attname = 'document_tsv' AND NOT attisdropped
+       )
+"""
+
+_stores = {}
+_stores_lock = threading.Lock()
+_docs_schema_ready = False
+startup_report = {}
+
+
+def get_vector_store(collection_name: str, async_mode: bool = False) -> PGVector:
+    key = (collection_name, async_mode)
+    store = _stores.get(key)
+    if store is None:
+        with _stores_lock:
+            store = _stores.get(key)
+            if store is None:
+                # async_mode=True: the store uses the async SQLAlchemy engine (psycopg 3),
+                # so the chatbot never blocks the event loop
+                store = PGVector(
+                    connection=get_async_engine() if async_mode else get_sync_engine(),
+                    collection_name=collection_name,
+                    embeddings=get_shared_embeddings(),
+                    async_mode=async_mode,
+                )
+                _stores[key] = store
+    return store
+
+
+def get_docs_store() -> PGVector:
+    """Sync store for the uploaded documents (ingest.py)."""
+    global _docs_schema_ready
+    store = get_vector_store(COLLECTION_NAME_DOCS)
+    if not _docs_schema_ready:
+        with _stores_lock:
+            if not _docs_schema_ready:
+                ensure_search_schema()
+                _docs_schema_ready = True
+    return store
+
+
+def ensure_search_schema():
+    """
+    The per-source index and the full-text column/index are created by
+    init_db.py. Their DDL locks langchain_pg_embedding, so it only runs here
+    when they are missing (a database where PGVector created the table after
+    init_db.py ran); otherwise this is a catalog read.
+    """
+    with get_sync_engine().begin() as con:
+        if con.execute(text(SEARCH_SCHEMA_READY_SQL)).scalar():
+            return
+        logger.warning("⚠️ Search indexes missing on langchain_pg_embedding; creating them (re-run init_db.py)")
+        con.execute(text(SOURCE_INDEX_SQL))
+        con.execute(text(TSV_COLUMN_SQL))
+        con.execute(text(TSV_INDEX_SQL))
+
+
+def get_preference_store() -> PGVector:
+    """Async store for learned user preferences (preference_worker.py)."""
+    return get_vector_store(COLLECTION_NAME_PREFS, async_mode=True)
+
+
+# --- Startup ---
+def _proc_status_mb(field: str):
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith(field + ":"):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except OSError:
+        pass
+    return None
+
+
+def _max_rss_mb():
+    try:
+        import resource
+    except ImportError:
+        return None  # Windows
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def memory_rss_mb():
+    """Resident memory of this process (peak RSS where the current value is unavailable)."""
+    rss = _proc_status_mb("VmRSS")
+    return rss if rss is not None else _max_rss_mb()
+
+
+def peak_rss_mb():
+    """Highest resident memory of this process so far."""
+    peak = _proc_status_mb("VmHWM")
+    return peak if peak is not None else _max_rss_mb()
+
+
+def warm_up(import_seconds: float) -> dict:
+    """Runs in the startup hook (in a thread). Records timings and memory in startup_report."""
+    started = time.perf_counter()
+    report = {"import_seconds": round(import_seconds, 3), "rss_after_import_mb": memory_rss_mb()}
+    try:
+        get_docs_store()
+    except Exception as e:
+        # The API still starts; the store is retried on first use
+        logger.error(f"❌ Could not prepare the '{COLLECTION_NAME_DOCS}' vector store: {e}")
+    if STARTUP_WARMUP:
+        # One forward pass each, so the first question does not pay for loading
+        get_shared_embeddings().embed_documents(["warm-up"])
+        if RERANK_ENABLED:
+            get_reranker().load()  # Logs and carries on if the model is unavailable
+    report.update({
+        "warmup": STARTUP_WARMUP,
+        "warmup_seconds": round(time.perf_counter() - started, 3),
+        "startup_seconds": round(import_seconds + time.perf_counter() - started, 3),
+        "rss_after_startup_mb": memory_rss_mb(),
+    })
+    startup_report.update(report)
+    logger.info(f"🚀 Startup report: {report}")
+    return report
+
+
+def process_stats() -> dict:
+    return {
+        **startup_report,
+        "rss_mb": memory_rss_mb(),
+        "embedding_model_loaded": get_shared_embeddings().loaded,
+        "vector_stores": [name + (" (async)" if async_mode else "") for name, async_mode in _stores],
+    }
@@ -0,0 +1,147 @@
+import os
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import List, Tuple
+import numpy as np
+from langchain_core.documents import Document
+
+logger = logging.getLogger(__name__)
+
+# --- Cross-Encoder Reranking ---
+# Retrieval over-fetches RERANK_CANDIDATES chunks, then a small local
+# cross-encoder scores each (question, chunk) pair. Only the best RERANK_TOP_K
+# chunks scoring at least RERANK_MIN_SCORE reach the prompt, which keeps the
+# prompt short for llama3.1 on CPU. Scores are cached per (question, chunk),
+# so repeated questions skip the model.
+# Reranking is best effort: if the model cannot be loaded (offline box,
+# failed download) or scoring fails, the hybrid-search order is kept and the
+# failure is logged once.
+RERANK_ENABLED = os.getenv("RERANK_ENABLED", "true").lower() == "true"
+RERANK_MODEL_NAME = os.getenv("RERANK_MODEL_NAME", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_CANDIDATES = int(os.getenv("RERANK_CANDIDATES", "10"))
+RERANK_TOP_K = int(os.getenv("RERANK_TOP_K", "3"))
+RERANK_MIN_SCORE = float(os.getenv("RERANK_MIN_SCORE", "0.2"))  # after sigmoid, 0..1
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "10000"))
+
+
+class CachedReranker:
+    def __init__(self, model_name: str = RERANK_MODEL_NAME, max_size: int = RERANK_CACHE_SIZE):
+        self.model_name = model_name
+        self.max_size = max_size
+        self._model = None
+        self._model_lock = threading.Lock()
+        self.load_error = None
+        self.failures = 0
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_model(self):
+        if self._model is None:
+            with self._model_lock:
+                if self._model is None:
+                    if self.load_error is not None:
+                        raise RuntimeError(self.load_error)  # Not retried on every question
+                    try:
+                        # Imported lazily: only processes that rerank pay for loading it
+                        from sentence_transformers import CrossEncoder
+                        self._model = CrossEncoder(self.model_name)
+                    except Exception as e:
+                        self.load_error = f"Could not load {self.model_name}: {e}"
+                        raise
+        return self._model
+
+    def load(self) -> bool:
+        """Loads the model (startup warm-up); False if it is unavailable."""
+        try:
+            self._get_model()
+            return True
+        except Exception as e:
+            self._log_failure(e)
+            return False
+
+    def _log_failure(self, error):
+        self.failures += 1
+        if self.failures == 1:
+            logger.error(f"❌ Reranking unavailable, keeping the retrieval order: {error}")
+
+    @staticmethod
+    def _key(question: str, text: str):
+        return (question.strip().lower(), hashlib.sha1(text.encode("utf-8")).hexdigest())
+
+    def score(self, question: str, texts: List[str]) -> List[float]:
+        """Relevance in 0..1 for each text; uncached pairs are scored in one batched call."""
+        keys = [self._key(question, text) for text in texts]
+        scores = [None] * len(texts)
+        with self._lock:
+            for i, key in enumerate(keys):
+                cached = self._cache.get(key)
+                if cached is not None:
+                    self._cache.move_to_end(key)
+                    scores[i] = cached
+                    self.hits += 1
+        missing = [i for i, score in enumerate(scores) if score is None]
+        if missing:
+            logits = self._get_model().predict(
+                [(question, texts[i]) for i in missing], batch_size=RERANK_BATCH_SIZE
+            )
+            fresh = 1.0 / (1.0 + np.exp(-np.asarray(logits, dtype=np.float64)))
+            with self._lock:
+                for i, score in zip(missing, fresh):
+                    scores[i] = float(score)
+                    self._cache[keys[i]] = scores[i]
+                    self._cache.move_to_end(keys[i])
+                    self.misses += 1
+                while len(self._cache) > self.max_size:
+                    self._cache.popitem(last=False)
+        return scores
+
+    def rerank(self, question: str, scored_docs: List[Tuple[Document, float]],
+               top_k: int = RERANK_TOP_K, min_score: float = RERANK_MIN_SCORE) -> List[Tuple[Document, float]]:
+        """Keeps the best `top_k` of [(doc, distance)] scoring at least `min_score`, best first."""
+        if not scored_docs:
+            return []
+        try:
+            scores = self.score(question, [doc.page_content for doc, _ in scored_docs])
+        except Exception as e:
+            self._log_failure(e)
+            return scored_docs[:top_k]
+        ranked = sorted(zip(scored_docs, scores), key=lambda pair: pair[1], reverse=True)
+        kept = []
+        for (doc, distance), score in ranked[:top_k]:
+            if score < min_score:
+                break
+            doc.metadata["rerank_score"] = round(score, 4)
+            kept.append((doc, distance))
+        return kept
+
+    async def arerank(self, question: str, scored_docs: List[Tuple[Document, float]], **kwargs):
+        # The cross-encoder is CPU-bound; keep it off the event loop
+        return await asyncio.get_running_loop().run_in_executor(
+            None, lambda: self.rerank(question, scored_docs, **kwargs)
+        )
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "model": self.model_name,
+            "loaded": self._model is not None,
+            "failures": self.failures,
+            "load_error": self.load_error,
+            "cache_size": len(self._cache),
+            "max_size": self.max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+@lru_cache(maxsize=None)
+def get_reranker() -> CachedReranker:
+    return CachedReranker()
@@ -0,0 +1,162 @@
+import os
+import re
+from decimal import Decimal
+from typing import Optional
+
+# --- Structured-Query Fast Path ---
+# "What is my balance reward points?", "who is my mentor?" and "status of my
+# ticket?" are answered from student_rewards / feedback_tickets, which never
+# reach the RAG context. A cheap regex router spots these questions before
+# rag_chain_core runs; each is answered with one indexed lookup
+# (users.id -> student_rewards.roll_no, feedback_tickets.user_id) and a
+# template, without embeddings, vector search or llama3.1.
+# Anything that is not clearly about the asker's own data (e.g. "how do I
+# redeem points?") goes through RAG as before.
+STRUCTURED_ANSWERS_ENABLED = os.getenv("STRUCTURED_ANSWERS_ENABLED", "true").lower() == "true"
+MAX_TICKETS_LISTED = 3
+
+PERSONAL = re.compile(r"\b(my|me|i|mine|i'm|im)\b")
+# Procedural questions are about policy, not about the asker's data
+PROCEDURAL = re.compile(r"\b(how (do|can|to|should|does)|(can|could|should) i|why|where|when)\b")
+# Questions about documents that mention points/mentors ("points table in the handbook")
+REFERENCE = re.compile(r"\b(table|handbook|policy|policies|rules?|criteria|scheme|circular|syllabus)\b")
+# "balance"/"redeem" alone ("balance fee", ...) are not enough; see REWARD_FIELDS.
+# "points" alone is not either ("points table for my course"): it needs "my
+# points", "how many points" or a balance/redeemed/total word.
+REWARDS = re.compile(r"\brewards?\b")
+POINTS = re.compile(r"\bpoints?\b")
+MY_POINTS = re.compile(r"\b(my|how many)( reward)? points?\b")
+MENTOR = re.compile(r"\bmentor\b")
+TICKET = re.compile(r"\b(tickets?|complaints?|feedbacks?)\b")
+TICKET_STATUS = re.compile(r"\b(status|update|progress|resolved|pending|open|closed|happened|track)\b")
+# Only explicit forms: "ticket #12", "ticket no. 12", "ticket number 12", or
+# "#12" in a question about a ticket. "a ticket 3 days ago" has no number.
+TICKET_NUMBER = re.compile(r"\b(?:ticket|complaint)\s*(?:#|no\.?|num(?:ber)?)\s*#?\s*(\d+)\b")
+HASH_NUMBER = re.compile(r"(?<![\w#])#(\d+)\b")
+
+REWARD_FIELDS = [
+    # (pattern, column, label)
+    (re.compile(r"\b(balance|left|remaining|available)\b"), "balance_points", "balance"),
+    (re.compile(r"\bredeem(ed)?\b"), "redeemed_points", "redeemed"),
+    (re.compile(r"\b(cumulative|total|earned)\b"), "cumulative_reward_points", "cumulative"),
+]
+
+REWARDS_SQL = """
+    SELECT r.roll_no, r.student_name, r.mentor_name,
+           r.cumulative_reward_points, r.redeemed_points, r.balance_points
+    FROM users u JOIN student_rewards r ON r.roll_no = u.roll_no
+    WHERE u.id = %s
+"""
+ROLL_NO_SQL = "SELECT roll_no FROM users WHERE id = %s"
+TICKETS_SQL = """
+    SELECT ticket_id, department, status, created_at, resolution_message
+    FROM feedback_tickets
+    WHERE user_id = %s
+    ORDER BY created_at DESC
+    LIMIT %s
+"""
+TICKET_SQL = """
+    SELECT ticket_id, department, status, created_at, resolution_message
+    FROM feedback_tickets
+    WHERE user_id = %s AND ticket_id = %s
+"""
+
+structured_stats = {"answered": 0, "by_intent": {}}
+
+
+def detect_intent(question: str):
+    """Returns (intent, ticket number or None), or (None, None) for RAG questions."""
+    text = question.lower()
+    # Before the procedural check: "when will my complaint be resolved?" asks for a status
+    if TICKET.search(text):
+        number = TICKET_NUMBER.search(text) or HASH_NUMBER.search(text)
+        if number or (PERSONAL.search(text) and TICKET_STATUS.search(text)):
+            return "ticket_status", int(number.group(1)) if number else None
+    if PROCEDURAL.search(text) or REFERENCE.search(text) or not PERSONAL.search(text):
+        return None, None
+    if MENTOR.search(text):
+        return "mentor", None
+    if REWARDS.search(text) or MY_POINTS.search(text) or (
+        POINTS.search(text) and any(pattern.search(text) for pattern, _, _ in REWARD_FIELDS)
+    ):
+        return "rewards", None
+    return None, None
+
+
+def format_points(value) -> str:
+    if value is None:
+        return "not recorded"
+    return f"{Decimal(value).normalize():f}"
+
+
+def format_ticket(ticket: dict) -> str:
+    line = (
+        f"Ticket #{ticket['ticket_id']} ({ticket['department']}, raised "
+        f"{ticket['created_at']:%d %b %Y}): {ticket['status']}"
+    )
+    if ticket["resolution_message"]:
+        line += f" - {ticket['resolution_message']}"
+    return line + "."
+
+
+# --- Answers ---
+async def not_linked_answer(conn, user_id: str) -> str:
+    row = await (await conn.execute(ROLL_NO_SQL, (user_id,))).fetchone()
+    if not row or not row["roll_no"]:
+        return "Your account is not linked to a student roll number, so I can't look up reward details."
+    return f"I couldn't find reward details for roll number {row['roll_no']}."
+
+
+async def rewards_answer(conn, question: str, user_id: str) -> str:
+    record = await (await conn.execute(REWARDS_SQL, (user_id,))).fetchone()
+    if not record:
+        return await not_linked_answer(conn, user_id)
+    text = question.lower()
+    fields = [(column, label) for pattern, column, label in REWARD_FIELDS if pattern.search(text)]
+    if not fields:
+        fields = [(column, label) for _, column, label in REWARD_FIELDS]
+    parts = ", ".join(f"{label}: {format_points(record[column])}" for column, label in fields)
+    return f"Reward points for {record['student_name']} ({record['roll_no']}) - {parts}."
+
+
+async def mentor_answer(conn, user_id: str) -> str:
+    record = await (await conn.execute(REWARDS_SQL, (user_id,))).fetchone()
+    if not record:
+        return await not_linked_answer(conn, user_id)
+    if not record["mentor_name"]:
+        return f"No mentor is recorded for {record['student_name']} ({record['roll_no']})."
+    return f"The mentor for {record['student_name']} ({record['roll_no']}) is {record['mentor_name']}."
+
+
+async def ticket_answer(conn, user_id: str, ticket_number: Optional[int]) -> str:
+    note = ""
+    if ticket_number is not None:
+        ticket = await (await conn.execute(TICKET_SQL, (user_id, ticket_number))).fetchone()
+        if ticket:
+            return format_ticket(ticket)
+        # Probably not a ticket number after all; the latest tickets answer it anyway
+        note = f"I couldn't find ticket #{ticket_number} on your account. "
+    tickets = await (await conn.execute(TICKETS_SQL, (user_id, MAX_TICKETS_LISTED))).fetchall()
+    if not tickets:
+        return note + "You haven't raised any feedback tickets yet."
+    if note:
+        note += "Your latest tickets:\n"
+    return note + "\n".join(format_ticket(ticket) for ticket in tickets)
+
+
+async def answer_structured(conn, question: str, user_id: str) -> Optional[dict]:
+    """Returns {"intent", "answer"} for structured questions, or None to fall through to RAG."""
+    if not STRUCTURED_ANSWERS_ENABLED:
+        return None
+    intent, ticket_number = detect_intent(question)
+    if intent == "rewards":
+        answer = await rewards_answer(conn, question, user_id)
+    elif intent == "mentor":
+        answer = await mentor_answer(conn, user_id)
+    elif intent == "ticket_status":
+        answer = await ticket_answer(conn, user_id, ticket_number)
+    else:
+        return None
+    structured_stats["answered"] += 1
+    structured_stats["by_intent"][intent] = structured_stats["by_intent"].get(intent, 0) + 1
+    return {"intent": intent, "answer": answer}
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# The backend modules are imported flat ("from db import ..."), as uvicorn runs them
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,65 @@
+from hybrid_search import fuse, needs_vector_search, plan_lexical_query
+
+
+def row(row_id, distance):
+    return {"id": row_id, "document": f"chunk {row_id}", "cmetadata": {}, "distance": distance}
+
+
+# --- plan_lexical_query ---
+def test_year_is_an_ordinary_term():
+    assert plan_lexical_query("hostel fee for the 2025 batch") == ("hostel & fee & for & the & 2025 & batch", False)
+
+
+def test_ordinal_is_an_ordinary_term():
+    assert plan_lexical_query("3rd year timetable") == ("3rd & year & timetable", False)
+
+
+def test_mixed_codes_are_exact():
+    assert plan_lexical_query("syllabus for CS3451 and 22CS101?") == ("cs3451 & 22cs101", True)
+
+
+def test_repeated_code_is_listed_once():
+    assert plan_lexical_query("CS3451 vs cs3451") == ("cs3451", True)
+
+
+def test_short_mixed_token_is_not_a_code():
+    assert plan_lexical_query("block A1 canteen") == ("block & a1 & canteen", False)
+
+
+def test_no_terms():
+    assert plan_lexical_query("??") == (None, False)
+
+
+# --- fuse ---
+def test_exact_with_enough_lexical_rows_skips_vector_search():
+    lexical = [row("a", 0.9), row("b", 0.4), row("c", 0.7)]
+    assert not needs_vector_search(lexical, exact=True, k=3)
+    results, mode = fuse(lexical, [], exact=True, k=3, max_distance=0.5)
+    assert mode == "lexical"
+    # Ranked by distance; identifier matches ignore the cut-off
+    assert [distance for _, distance in results] == [0.4, 0.7, 0.9]
+
+
+def test_exact_with_too_few_lexical_rows_runs_vector_search():
+    lexical = [row("a", 0.9)]
+    assert needs_vector_search(lexical, exact=True, k=3)
+    results, mode = fuse(lexical, [row("b", 0.3), row("c", 0.8)], exact=True, k=3, max_distance=0.5)
+    assert mode == "hybrid+exact"
+    # "a" is exempt from the cut-off, "c" is not
+    assert sorted(doc.page_content for doc, _ in results) == ["chunk a", "chunk b"]
+
+
+def test_year_question_keeps_the_cut_off():
+    tsquery, exact = plan_lexical_query("hostel fee for the 2025 batch")
+    lexical = [row("a", 0.9), row("b", 0.8), row("c", 0.7)]
+    assert needs_vector_search(lexical, exact, k=3)
+    results, mode = fuse(lexical, [row("d", 0.2)], exact, k=3, max_distance=0.5)
+    assert mode == "hybrid"
+    assert [doc.page_content for doc, _ in results] == ["chunk d"]
+
+
+def test_rrf_prefers_rows_in_both_lists():
+    lexical = [row("a", 0.3), row("b", 0.2)]
+    vector = [row("b", 0.2), row("c", 0.1)]
+    results, _ = fuse(lexical, vector, exact=False, k=3, max_distance=None)
+    assert results[0][0].page_content == "chunk b"
@@ -0,0 +1,65 @@
+import asyncio
+from datetime import datetime
+import pytest
+from structured_answers import detect_intent, ticket_answer
+
+
+@pytest.mark.parametrize("question, expected", [
+    # Rewards
+    ("What is my balance reward points?", ("rewards", None)),
+    ("how many points do I have left", ("rewards", None)),
+    ("show my points", ("rewards", None)),
+    ("my total reward points", ("rewards", None)),
+    ("what is the points table for my course in the handbook", (None, None)),
+    ("what is my balance fee", (None, None)),
+    ("how do I redeem my reward points?", (None, None)),
+    # Mentor
+    ("who is my mentor?", ("mentor", None)),
+    ("what is the mentor policy for my year", (None, None)),
+    ("who is the mentor for CSE?", (None, None)),
+    # Tickets
+    ("status of my ticket?", ("ticket_status", None)),
+    ("when will my complaint be resolved?", ("ticket_status", None)),
+    ("I raised a ticket 3 days ago, any update?", ("ticket_status", None)),
+    ("what is the status of ticket #42", ("ticket_status", 42)),
+    ("ticket no. 17 status", ("ticket_status", 17)),
+    ("any update on ticket number 8?", ("ticket_status", 8)),
+    ("my complaint #12 is still open", ("ticket_status", 12)),
+    ("wifi in my room #204 is not working, please update", (None, None)),
+    ("how do I raise a ticket?", (None, None)),
+])
+def test_detect_intent(question, expected):
+    assert detect_intent(question) == expected
+
+
+class FakeCursor:
+    def __init__(self, rows):
+        self.rows = rows
+
+    async def fetchone(self):
+        return self.rows[0] if self.rows else None
+
+    async def fetchall(self):
+        return self.rows
+
+
+class FakeConnection:
+    def __init__(self, tickets):
+        self.tickets = tickets
+
+    async def execute(self, sql, params):
+        if "ticket_id = %s" in sql:
+            return FakeCursor([t for t in self.tickets if t["ticket_id"] == params[1]])
+        return FakeCursor(self.tickets[:params[1]])
+
+
+def test_unknown_ticket_number_lists_latest_tickets():
+    ticket = {
+        "ticket_id": 5, "department": "Hostel", "status": "open",
+        "created_at": datetime(2025, 10, 1), "resolution_message": None,
+    }
+    answer = asyncio.run(ticket_answer(FakeConnection([ticket]), "user-1", 3))
+    assert answer == (
+        "I couldn't find ticket #3 on your account. Your latest tickets:\n"
+        "Ticket #5 (Hostel, raised 01 Oct 2025): open."
+    )
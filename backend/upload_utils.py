@@ -0,0 +1,69 @@
+import os
+import time
+import logging
+from contextlib import contextmanager
+from fastapi import UploadFile, HTTPException
+from registry import memory_rss_mb, peak_rss_mb
+
+logger = logging.getLogger(__name__)
+
+# --- Streaming Uploads ---
+# Uploads are copied to disk UPLOAD_CHUNK_SIZE bytes at a time instead of
+# `await file.read()`, so a request never holds the whole file in memory, and
+# anything over the size limit is rejected with 413 as soon as it crosses it.
+UPLOAD_CHUNK_SIZE = int(os.getenv("UPLOAD_CHUNK_SIZE", str(1024 * 1024)))
+MAX_PDF_UPLOAD_MB = int(os.getenv("MAX_PDF_UPLOAD_MB", "200"))
+MAX_CSV_UPLOAD_MB = int(os.getenv("MAX_CSV_UPLOAD_MB", "50"))
+# Rows per DataFrame when importing CSVs
+CSV_CHUNK_ROWS = int(os.getenv("CSV_CHUNK_ROWS", "5000"))
+
+
+async def save_upload(file: UploadFile, dest_path: str, max_mb: int) -> int:
+    """Streams `file` to `dest_path` and returns the number of bytes written."""
+    max_bytes = max_mb * 1024 * 1024
+    part_path = dest_path + ".part"
+    written = 0
+    try:
+        with open(part_path, "wb") as out:
+            while True:
+                chunk = await file.read(UPLOAD_CHUNK_SIZE)
+                if not chunk:
+                    break
+                written += len(chunk)
+                if written > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File is larger than the {max_mb} MB limit.")
+                out.write(chunk)
+        # Only a complete upload replaces an earlier file of the same name
+        os.replace(part_path, dest_path)
+    finally:
+        if os.path.exists(part_path):
+            os.remove(part_path)
+    return written
+
+
+# --- Memory per upload ---
+# Always on, and cheap (reads of /proc/self/status or getrusage): the growth
+# of the process's resident memory over an import or ingest job, and the
+# process's peak RSS at the end of it. Both are process-wide, so work running
+# at the same time (other imports, the chatbot) is included.
+class MemoryReport:
+    def __init__(self):
+        self.rss_start_mb = memory_rss_mb()
+        self.started = time.perf_counter()
+
+    def snapshot(self) -> dict:
+        rss = memory_rss_mb()
+        return {
+            "rss_delta_mb": round(rss - self.rss_start_mb, 1) if None not in (rss, self.rss_start_mb) else None,
+            "peak_rss_mb": peak_rss_mb(),
+        }
+
+
+@contextmanager
+def track_memory(label: str):
+    report = MemoryReport()
+    try:
+        yield report
+    finally:
+        seconds = round(time.perf_counter() - report.started, 3)
+        logger.info(f"{label}: memory {report.snapshot()} over {seconds}s")
@@ -0,0 +1,224 @@
+import os
+import re
+import json
+import time
+import logging
+from psycopg2.extras import RealDictCursor
+from db import get_connection, release_connection, load_vector_search_settings, vector_search_settings_sql
+
+logger = logging.getLogger(__name__)
+
+# --- ANN Index Manager for the PGVector collections ---
+# Without an index every similarity search is an exact scan over all vectors
+# of the collection. Each collection can get one partial HNSW or IVFFlat index
+# (WHERE collection_id = <its uuid>), so PGVector's
+#   WHERE collection_id = ... ORDER BY embedding <=> q LIMIT k
+# queries use it. Builds run CONCURRENTLY under a temporary name and then
+# replace the old index, so searches keep working during a rebuild.
+#
+# pgvector can only index a column with a fixed dimension. Typing
+# langchain_pg_embedding.embedding as vector(EMBEDDING_DIMENSION) rewrites the
+# table under an exclusive lock, so it is a migration in init_db.py, and
+# builds refuse to run until it has been done.
+EMBEDDING_DIMENSION = 384  # all-MiniLM-L6-v2, same as answer_cache
+VECTOR_INDEX_BUILD_MEMORY = os.getenv("VECTOR_INDEX_BUILD_MEMORY", "512MB")
+INDEX_METHODS = ("hnsw", "ivfflat")
+
+
+class VectorIndexError(Exception):
+    pass
+
+
+def index_name(collection_name: str) -> str:
+    return "ann_" + re.sub(r"[^a-z0-9_]", "_", collection_name.lower())
+
+
+def get_collection_uuid(curs, collection_name: str) -> str:
+    curs.execute("SELECT uuid FROM langchain_pg_collection WHERE name = %s", (collection_name,))
+    row = curs.fetchone()
+    if not row:
+        raise VectorIndexError(f"Collection '{collection_name}' does not exist")
+    return str(row[0])
+
+
+def check_typed_embedding_column(curs):
+    curs.execute(
+        """
+        SELECT format_type(atttypid, atttypmod) FROM pg_attribute
+        WHERE attrelid = 'langchain_pg_embedding'::regclass AND attname = 'embedding'
+        """
+    )
+    column_type = curs.fetchone()[0]
+    if column_type != f"vector({EMBEDDING_DIMENSION})":
+        raise VectorIndexError(
+            f"langchain_pg_embedding.embedding is {column_type}, not vector({EMBEDDING_DIMENSION}). "
+            "Run init_db.py (during a maintenance window) to type it before building an index."
+        )
+
+
+def count_vectors(curs, collection_uuid: str) -> int:
+    curs.execute("SELECT COUNT(*) FROM langchain_pg_embedding WHERE collection_id = %s", (collection_uuid,))
+    return curs.fetchone()[0]
+
+
+def build_index(collection_name: str, method: str = "hnsw", m: int = 16, ef_construction: int = 64, lists: int = None) -> dict:
+    """Builds (or rebuilds) the collection's ANN index. Returns build time and size."""
+    if method not in INDEX_METHODS:
+        raise VectorIndexError(f"Unknown index method '{method}'. Use one of {INDEX_METHODS}.")
+    name = index_name(collection_name)
+    conn = get_connection()
+    try:
+        # CREATE/DROP INDEX CONCURRENTLY cannot run inside a transaction
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as curs:
+            collection_uuid = get_collection_uuid(curs, collection_name)
+            check_typed_embedding_column(curs)
+            rows = count_vectors(curs, collection_uuid)
+            if method == "hnsw":
+                options = f"m = {int(m)}, ef_construction = {int(ef_construction)}"
+            else:
+                # pgvector's guideline: rows / 1000 lists (IVFFlat needs data before it is built)
+                lists = int(lists or max(rows // 1000, 10))
+                options = f"lists = {lists}"
+
+            curs.execute(f"SET maintenance_work_mem = '{VECTOR_INDEX_BUILD_MEMORY}'")
+            curs.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}_new")
+            started = time.perf_counter()
+            curs.execute(
+                f"""
+                CREATE INDEX CONCURRENTLY {name}_new ON langchain_pg_embedding
+                USING {method} (embedding vector_cosine_ops) WITH ({options})
+                WHERE collection_id = '{collection_uuid}'
+                """
+            )
+            build_seconds = time.perf_counter() - started
+            curs.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {name}")
+            curs.execute(f"ALTER INDEX {name}_new RENAME TO {name}")
+            curs.execute("SELECT pg_relation_size(%s::regclass)", (name,))
+            size_bytes = curs.fetchone()[0]
+            # The connection goes back to the shared pool
+            curs.execute("RESET maintenance_work_mem")
+    finally:
+        conn.autocommit = False
+        release_connection(conn)
+
+    logger.info(f"Built {method} index {name} over {rows} vectors in {build_seconds:.1f}s")
+    return {
+        "collection": collection_name,
+        "index": name,
+        "method": method,
+        "options": options,
+        "vectors": rows,
+        "build_seconds": round(build_seconds, 3),
+        "size_bytes": size_bytes,
+    }
+
+
+def drop_index(collection_name: str):
+    conn = get_connection()
+    try:
+        conn.rollback()
+        conn.autocommit = True
+        with conn.cursor() as curs:
+            curs.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name(collection_name)}")
+    finally:
+        conn.autocommit = False
+        release_connection(conn)
+
+
+def index_status() -> dict:
+    """Every collection with its vector count and ANN index (if any)."""
+    conn = get_connection()
+    try:
+        with conn.cursor(cursor_factory=RealDictCursor) as curs:
+            curs.execute(
+                """
+                SELECT c.name, c.uuid::text AS uuid, COUNT(e.id) AS vectors
+                FROM langchain_pg_collection c
+                LEFT JOIN langchain_pg_embedding e ON e.collection_id = c.uuid
+                GROUP BY c.name, c.uuid ORDER BY c.name
+                """
+            )
+            collections = curs.fetchall()
+            for collection in collections:
+                curs.execute(
+                    """
+                    SELECT am.amname AS method, cls.reloptions AS options,
+                           pg_relation_size(cls.oid) AS size_bytes, idx.indisvalid AS valid
+                    FROM pg_class cls
+                    JOIN pg_am am ON am.oid = cls.relam
+                    JOIN pg_index idx ON idx.indexrelid = cls.oid
+                    WHERE cls.relname = %s
+                    """,
+                    (index_name(collection["name"]),)
+                )
+                collection["index"] = curs.fetchone()
+        settings = load_vector_search_settings(conn)
+    finally:
+        conn.rollback()
+        release_connection(conn)
+    return {"collections": collections, "query_settings": settings}
+
+
+def check_recall(collection_name: str, sample_size: int = 50, k: int = 5) -> dict:
+    """
+    Uses `sample_size` stored vectors as queries and compares the ANN top-k
+    (with the current ef_search/probes) against an exact scan.
+    """
+    conn = get_connection()
+    try:
+        with conn.cursor() as curs:
+            collection_uuid = get_collection_uuid(curs, collection_name)
+            curs.execute(
+                """
+                SELECT embedding::text FROM langchain_pg_embedding
+                WHERE collection_id = %s ORDER BY random() LIMIT %s
+                """,
+                (collection_uuid, sample_size)
+            )
+            queries = [row[0] for row in curs.fetchall()]
+            if not queries:
+                raise VectorIndexError(f"Collection '{collection_name}' has no vectors")
+
+            # The collection uuid is inlined so the planner can match the partial index
+            search_sql = f"""
+                SELECT id FROM langchain_pg_embedding
+                WHERE collection_id = '{collection_uuid}'
+                ORDER BY embedding <=> %s::vector LIMIT %s
+            """
+
+            settings = {}
+
+            def run(index_scans: bool):
+                results, seconds = [], 0.0
+                curs.execute(f"SET LOCAL enable_indexscan = {'on' if index_scans else 'off'}")
+                # The stored settings, as every worker's searches use them
+                curs.execute(vector_search_settings_sql())
+                settings.update((name, int(value)) for name, value in curs.fetchall())
+                for query in queries:
+                    started = time.perf_counter()
+                    curs.execute(search_sql, (query, k))
+                    results.append({row[0] for row in curs.fetchall()})
+                    seconds += time.perf_counter() - started
+                return results, seconds
+
+            exact, exact_seconds = run(index_scans=False)
+            approximate, ann_seconds = run(index_scans=True)
+            curs.execute("EXPLAIN (FORMAT JSON) " + search_sql, (queries[0], k))
+            plan = curs.fetchone()[0]
+    finally:
+        conn.rollback()
+        release_connection(conn)
+
+    recalls = [len(a & e) / len(e) for a, e in zip(approximate, exact) if e]
+    return {
+        "collection": collection_name,
+        "queries": len(queries),
+        "k": k,
+        "recall": round(sum(recalls) / len(recalls), 4) if recalls else None,
+        "exact_avg_ms": round(1000 * exact_seconds / len(queries), 2),
+        "ann_avg_ms": round(1000 * ann_seconds / len(queries), 2),
+        "uses_index": index_name(collection_name) in json.dumps(plan),
+        "query_settings": settings,
+    }